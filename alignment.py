@@ -0,0 +1,185 @@
+from functools import lru_cache
+
+try:
+    from rapidfuzz.fuzz import ratio as _rapidfuzz_ratio
+    from rapidfuzz.process import extract as _rapidfuzz_extract
+    from rapidfuzz.distance.Levenshtein import opcodes as _levenshtein_opcodes
+except ImportError:
+    _rapidfuzz_ratio = _rapidfuzz_extract = _levenshtein_opcodes = None
+
+# ================= WORD ALIGNMENT =================
+# Aligns what the child said with the expected sentence word by word, using
+# a token-level edit distance, so one added or dropped word does not shift
+# every later word out of place.
+#
+# Two words count as the same when their similarity ratio (2 * LCS / total
+# length, the same scale as difflib's SequenceMatcher.ratio) is at least
+# MATCH_THRESHOLD. rapidfuzz is optional: when it is installed, the ratio
+# and (in the usual case, see _align_fast) the whole alignment run in C.
+# Otherwise a bit-parallel LCS and a banded edit-distance table in Python
+# are used.
+MATCH_THRESHOLD = 0.8
+
+# Alignment operations: (op, expected_word, spoken_word)
+MATCH = "match"
+SUBSTITUTE = "substitute"
+DELETE = "delete"   # Expected word the child left out (spoken_word is None)
+INSERT = "insert"   # Extra word the child said (expected_word is None)
+
+def _lcs_length(a, b):
+    """Length of the longest common subsequence (Hyyro's bit-vector algorithm)"""
+    if not a or not b:
+        return 0
+    masks = {}
+    for i, char in enumerate(a):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    v = full
+    for char in b:
+        u = v & masks.get(char, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(a) - bin(v).count("1")
+
+def ratio(a, b):
+    """Similarity of two strings from 0.0 to 1.0"""
+    if a == b:
+        return 1.0
+    total = len(a) + len(b)
+    if not total:
+        return 1.0
+    if _rapidfuzz_ratio is not None:
+        return _rapidfuzz_ratio(a, b) / 100.0
+    return 2.0 * _lcs_length(a, b) / total
+
+@lru_cache(maxsize=65536)
+def words_match(spoken, expected, threshold=MATCH_THRESHOLD):
+    """Whether a spoken word is close enough to the expected one"""
+    if spoken == expected:
+        return True
+    # The ratio can't reach the threshold when the lengths differ too much
+    shorter, longer = sorted((len(spoken), len(expected)))
+    if 2.0 * shorter / (shorter + longer) < threshold:
+        return False
+    return ratio(spoken, expected) >= threshold
+
+def align_words(spoken_words, expected_words, threshold=MATCH_THRESHOLD):
+    """Minimum-edit alignment of two word lists, as a list of (op, expected, spoken)"""
+    # Words said exactly right at either end are matches; only the middle needs the table
+    start = 0
+    limit = min(len(spoken_words), len(expected_words))
+    while start < limit and spoken_words[start] == expected_words[start]:
+        start += 1
+    end = 0
+    while end < limit - start and spoken_words[-1 - end] == expected_words[-1 - end]:
+        end += 1
+    head = [(MATCH, word, word) for word in expected_words[:start]]
+    tail = [(MATCH, word, word) for word in expected_words[len(expected_words) - end:]]
+    spoken = spoken_words[start:len(spoken_words) - end]
+    expected = expected_words[start:len(expected_words) - end]
+    middle = None
+    if _levenshtein_opcodes is not None:
+        middle = _align_fast(spoken, expected, threshold)
+    if middle is None:
+        middle = _align(spoken, expected, threshold)
+    return head + middle + tail
+
+@lru_cache(maxsize=65536)
+def _matches(spoken, expected_words, threshold):
+    """Indexes of the words in expected_words (a tuple) that spoken matches"""
+    hits = _rapidfuzz_extract(spoken, expected_words, scorer=_rapidfuzz_ratio,
+                              score_cutoff=round(threshold * 100, 6), limit=None)
+    return tuple(index for _, _, index in hits)
+
+def _align_fast(spoken_words, expected_words, threshold):
+    """Alignment in C via rapidfuzz, or None when a spoken word matches several expected words.
+
+    Each spoken word is replaced by a code for the expected word it matches
+    (or a code of its own), so plain equality means "words match" and
+    rapidfuzz's Levenshtein opcodes give the same alignment cost as the table.
+    That only holds when no spoken word matches two different expected words.
+    """
+    distinct = tuple(dict.fromkeys(expected_words))
+    codes = {word: index for index, word in enumerate(distinct)}
+    spoken_codes = []
+    for position, word in enumerate(spoken_words):
+        hits = _matches(word, distinct, threshold)
+        if len(hits) > 1:
+            return None
+        spoken_codes.append(hits[0] if hits else -1 - position)
+
+    ops = []
+    for block in _levenshtein_opcodes(spoken_codes, [codes[word] for word in expected_words]):
+        spoken_block = spoken_words[block.src_start:block.src_end]
+        expected_block = expected_words[block.dest_start:block.dest_end]
+        if block.tag == "equal":
+            ops.extend((MATCH, expected, spoken) for expected, spoken in zip(expected_block, spoken_block))
+        elif block.tag == "replace":
+            ops.extend((SUBSTITUTE, expected, spoken) for expected, spoken in zip(expected_block, spoken_block))
+        elif block.tag == "insert":
+            ops.extend((DELETE, expected, None) for expected in expected_block)
+        else:
+            ops.extend((INSERT, None, spoken) for spoken in spoken_block)
+    return ops
+
+def _align(spoken_words, expected_words, threshold):
+    n, m = len(expected_words), len(spoken_words)
+    # Ukkonen's band: if the distance is at most `band`, cells further than
+    # `band` from the diagonal can't be on the best path. Most attempts are
+    # only a couple of words off, so try a narrow band before the full table.
+    band = max(abs(n - m), 2)
+    cost, same = _banded_table(spoken_words, expected_words, threshold, band)
+    if cost[n][m] > band and band < max(n, m):
+        cost, same = _banded_table(spoken_words, expected_words, threshold, max(n, m))
+
+    # Walk back, preferring match/substitute over a delete + insert pair
+    ops = []
+    i, j = n, m
+    while i or j:
+        match = None
+        if i and j:
+            lo, matches = same[i]
+            if lo <= j < lo + len(matches):
+                match = matches[j - lo]
+        if match is not None and cost[i][j] == cost[i - 1][j - 1] + (0 if match else 1):
+            ops.append((MATCH if match else SUBSTITUTE, expected_words[i - 1], spoken_words[j - 1]))
+            i -= 1
+            j -= 1
+        elif i and cost[i][j] == cost[i - 1][j] + 1:
+            ops.append((DELETE, expected_words[i - 1], None))
+            i -= 1
+        else:
+            ops.append((INSERT, None, spoken_words[j - 1]))
+            j -= 1
+    ops.reverse()
+    return ops
+
+def _banded_table(spoken_words, expected_words, threshold, band):
+    """Edit-distance table limited to |i - j| <= band, and the word matches it looked at"""
+    n, m = len(expected_words), len(spoken_words)
+    outside = n + m + 1
+    # cost[i][j]: edits to turn the first j spoken words into the first i expected words
+    cost = [[outside] * (m + 1) for _ in range(n + 1)]
+    first = cost[0]
+    for j in range(min(m, band) + 1):
+        first[j] = j
+    # same[i][j - lo]: whether spoken word j matches expected word i, for j in lo..hi
+    same = [None]
+    for i in range(1, n + 1):
+        row = cost[i]
+        above = cost[i - 1]
+        expected = expected_words[i - 1]
+        lo = max(1, i - band)
+        hi = min(m, i + band)
+        matches = [words_match(spoken, expected, threshold) for spoken in spoken_words[lo - 1:hi]]
+        same.append((lo, matches))
+        if i <= band:
+            row[0] = i
+        left = row[lo - 1]
+        for j in range(lo, hi + 1):
+            best = above[j - 1] if matches[j - lo] else above[j - 1] + 1
+            if above[j] + 1 < best:
+                best = above[j] + 1
+            if left + 1 < best:
+                best = left + 1
+            row[j] = left = best
+    return cost, same
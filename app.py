@@ -1,149 +1,100 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, g, abort
 import os
 from dotenv import load_dotenv
-from gtts import gTTS
 from difflib import SequenceMatcher
 from groq import Groq
-import uuid
+from tts import speak_to_file, prerendered_audio, prerender, cache_stats as audio_cache_stats
+from storage import create_store, SQLiteUserStore, STUDENT_SORT_COLUMNS
+from context_store import create_context_store
+from context_window import as_context, add_turn
+from prefetch import PrefetchPool
+from llm import LLMGateway, LLMUnavailable
+from alignment import MATCH, SUBSTITUTE, DELETE
+from scoring import score_attempt, score_attempts, index_vocabulary
+from content_bank import load_content_bank, WORD_LIMITS
+from meaning_cache import MeaningCache, cache_version
+from usage_cache import UsageCache
+from attempt_log import AttemptLog
+import metrics
+from leveling import level_for_xp, level_progress, difficulty_for_level
+import click
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import re
 import json
+import itertools
+import base64
 from datetime import datetime
 import random
 
 # ================= SETUP =================
 load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Retries are done by the gateway, with a deadline and circuit breaker
+client = Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+llm = LLMGateway(client)
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here-change-in-production'
 
-# Separate conversation contexts for each mode
-conversation_contexts = {}  # Format: {user_id: {'conversation': '', 'roleplay': ''}}
+# Shared, bounded pool for independent steps inside a request (TTS renders, LLM calls).
+# Only leaf tasks are submitted to it, never work that waits on the pool itself.
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("WORKER_THREADS", "8")))
 
-# User database
-users_db = {}
+# Separate pool for background refills, so prefetching never delays a request's own work
+background_executor = ThreadPoolExecutor(max_workers=int(os.getenv("BACKGROUND_THREADS", "4")))
 
-# Teacher database (now includes registered teachers)
-teachers_db = {}
+# Separate conversation contexts for each mode (see context_store.py)
+context_store = create_context_store()
 
-# Progressive XP requirements
-def get_xp_for_level(level):
-    """Calculate total XP required to reach a level"""
-    if level <= 1:
-        return 0
-    xp = 0
-    for l in range(1, level):
-        if l == 1:
-            xp += 25
-        else:
-            xp += 30
-    return xp
-
-def calculate_level(xp):
-    """Calculate level based on current XP"""
-    level = 1
-    while xp >= get_xp_for_level(level + 1):
-        level += 1
-    return level
-
-def get_xp_for_next_level(current_level):
-    """Get XP required for next level"""
-    if current_level == 1:
-        return 25
-    else:
-        return 30
-
-def get_difficulty_for_level(level):
-    """Auto-adjust difficulty based on level"""
-    if level <= 2:
-        return "easy"
-    elif level <= 4:
-        return "easy"
-    elif level <= 7:
-        return "medium"
-    elif level <= 10:
-        return "medium"
-    else:
-        return "hard"
-
-def save_user_progress(user_id, stars_earned, mode):
-    """Save user progress and update XP"""
-    if user_id in users_db:
-        old_level = users_db[user_id]['level']
-        users_db[user_id]['total_xp'] += stars_earned
-        users_db[user_id]['total_stars'] += stars_earned
-        new_level = calculate_level(users_db[user_id]['total_xp'])
-        users_db[user_id]['level'] = new_level
-        users_db[user_id]['last_active'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        if mode not in users_db[user_id]['mode_stats']:
-            users_db[user_id]['mode_stats'][mode] = {'stars': 0, 'sessions': 0}
-        
-        users_db[user_id]['mode_stats'][mode]['stars'] += stars_earned
-        users_db[user_id]['mode_stats'][mode]['sessions'] += 1
-        
-        save_database()
-        
-        return {
-            'leveled_up': new_level > old_level,
-            'new_level': new_level,
-            'old_level': old_level
-        }
-    return None
+# Student and teacher database (see storage.py)
+store = create_store()
 
-def save_database():
-    """Save databases to JSON files"""
-    try:
-        with open('users_data.json', 'w') as f:
-            json.dump(users_db, f, indent=2)
-        with open('teachers_data.json', 'w') as f:
-            json.dump(teachers_db, f, indent=2)
-    except Exception as e:
-        print(f"Error saving database: {e}")
+def class_of(user_id):
+    user = store.get_user(user_id)
+    return (user['class'], user['division']) if user else None
 
-def load_database():
-    """Load databases from JSON files"""
-    global users_db, teachers_db
-    try:
-        if os.path.exists('users_data.json'):
-            with open('users_data.json', 'r') as f:
-                users_db = json.load(f)
-        if os.path.exists('teachers_data.json'):
-            with open('teachers_data.json', 'r') as f:
-                teachers_db = json.load(f)
-    except Exception as e:
-        print(f"Error loading database: {e}")
-        users_db = {}
-        teachers_db = {}
+# Every scored attempt, with daily rollups for teacher analytics (see attempt_log.py)
+attempt_log = AttemptLog(os.getenv("ATTEMPT_LOG_PATH", os.getenv("DATABASE_PATH", "smartspeak.db")), class_of)
 
-load_database()
+def save_user_progress(user_id, stars_earned, mode):
+    """Save user progress and update XP"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    levels = store.add_progress(user_id, stars_earned, mode, level_for_xp, now)
+    if levels is None:
+        return None
+    old_level, new_level = levels
+    return {
+        'leveled_up': new_level > old_level,
+        'new_level': new_level,
+        'old_level': old_level
+    }
 
 def get_user_context(user_id, mode):
-    """Get conversation context for specific user and mode"""
-    if user_id not in conversation_contexts:
-        conversation_contexts[user_id] = {'conversation': '', 'roleplay': ''}
-    return conversation_contexts[user_id].get(mode, '')
+    """Get conversation context for specific user and mode (see context_window.py)"""
+    return as_context(context_store.get(user_id, mode))
 
 def update_user_context(user_id, mode, context):
     """Update conversation context for specific user and mode"""
-    if user_id not in conversation_contexts:
-        conversation_contexts[user_id] = {'conversation': '', 'roleplay': ''}
-    conversation_contexts[user_id][mode] = context[-1200:]  # Keep last 1200 chars
-
-# ================= TTS =================
-def speak_to_file(text, slow=False):
-    os.makedirs("static/audio", exist_ok=True)
-    filename = f"{uuid.uuid4()}.mp3"
-    path = f"static/audio/{filename}"
-    gTTS(text=text, lang="en", slow=slow).save(path)
-    return "/" + path
+    context_store.set(user_id, mode, context)
+
+def audio_for(text, slow=False):
+    """Pre-rendered audio if available, otherwise a (cached) synthesis"""
+    return prerendered_audio(text, slow=slow) or speak_to_file(text, slow=slow)
+
+def still_on_disk(audio, text, slow=False):
+    """A cached audio URL, rendered again from text if the audio cache has evicted its clip.
+
+    Rendering the same text gives the same URL, so callers can keep storing it.
+    """
+    if os.path.exists(audio.lstrip("/")):
+        return audio
+    return audio_for(text, slow=slow)
 
 # ================= AI FUNCTIONS WITH ISOLATED MEMORY =================
 
-def english_coach(child_text, user_id):
-    """Conversation mode with isolated memory per user"""
-    context = get_user_context(user_id, 'conversation')
-    
+def english_coach_prompt(child_text, context):
+    """Prompt for conversation mode"""
     prompt_variations = [
         "make the response natural and conversational",
         "use different words than previous responses",
@@ -177,24 +128,31 @@ Conversation so far:
 Child says:
 "{child_text}"
 """
+    return prompt
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-        top_p=0.9
-    )
+def canned_coach_reply():
+    """Coach-format reply for when the LLM is unavailable (nothing is corrected)"""
+    return ("CORRECT: Let's keep talking\n"
+            "PRAISE: Thank you for sharing that with me!\n"
+            "QUESTION: Can you tell me more about it?")
 
-    reply = response.choices[0].message.content.strip()
-    new_context = context + f"\nChild: {child_text}\nAssistant: {reply}"
-    update_user_context(user_id, 'conversation', new_context)
+def english_coach(child_text, user_id):
+    """Conversation mode with isolated memory per user"""
+    context = get_user_context(user_id, 'conversation')
+    prompt = english_coach_prompt(child_text, context['text'])
+
+    try:
+        reply = llm.complete(prompt, temperature=0.7, top_p=0.9)
+    except LLMUnavailable as e:
+        print(f"Error getting coach reply: {e}")
+        return canned_coach_reply()
+
+    remember_coach_turn(user_id, 'conversation', child_text, reply, context)
     
     return reply
 
-def roleplay_coach(child_text, roleplay_type, user_id):
-    """Roleplay mode with isolated memory per user"""
-    context = get_user_context(user_id, 'roleplay')
-
+def roleplay_coach_prompt(child_text, roleplay_type, context):
+    """Prompt for roleplay mode"""
     roles = {
         "teacher": """
 You are a kind school teacher.
@@ -257,23 +215,67 @@ Conversation so far:
 Student says:
 "{child_text}"
 """
+    return prompt
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-        top_p=0.9
-    )
+def roleplay_coach(child_text, roleplay_type, user_id):
+    """Roleplay mode with isolated memory per user"""
+    context = get_user_context(user_id, 'roleplay')
+    prompt = roleplay_coach_prompt(child_text, roleplay_type, context['text'])
 
-    reply = response.choices[0].message.content.strip()
-    new_context = context + f"\nStudent: {child_text}\nAssistant: {reply}"
-    update_user_context(user_id, 'roleplay', new_context)
+    try:
+        reply = llm.complete(prompt, temperature=0.7, top_p=0.9)
+    except LLMUnavailable as e:
+        print(f"Error getting coach reply: {e}")
+        return canned_coach_reply()
+
+    remember_coach_turn(user_id, 'roleplay', child_text, reply, context)
     
     return reply
 
+def coach_prompt(child_text, roleplay, context):
+    """Prompt for conversation mode, or roleplay mode when roleplay names a role"""
+    if roleplay:
+        return roleplay_coach_prompt(child_text, roleplay, context['text'])
+    return english_coach_prompt(child_text, context['text'])
+
+def remember_coach_turn(user_id, mode, child_text, reply, context):
+    """Append one exchange to the user's context for mode"""
+    speaker = "Student" if mode == 'roleplay' else "Child"
+    topic = parse_coach_reply(reply)['question']
+    update_user_context(user_id, mode, add_turn(context, speaker, child_text, reply, topic))
+
+COACH_FIELDS = {"CORRECT:": "correct", "PRAISE:": "praise", "QUESTION:": "question"}
+
+def parse_coach_line(line):
+    """Return (field, value) for a CORRECT/PRAISE/QUESTION line, else None"""
+    for prefix, field in COACH_FIELDS.items():
+        if line.startswith(prefix):
+            return field, line.replace(prefix, "").strip()
+    return None
+
+def coach_reply_text(fields):
+    return f"{fields['correct']}. {fields['praise']} {fields['question']}"
+
+def parse_coach_reply(reply):
+    """Split a coach reply into its correct, praise and question parts"""
+    fields = {"correct": "", "praise": "", "question": ""}
+    for line in reply.split("\n"):
+        parsed = parse_coach_line(line)
+        if parsed:
+            fields[parsed[0]] = parsed[1]
+    return fields
+
 # ================= REPEAT & SPELL BEE FUNCTIONS =================
-def generate_repeat_sentence(category="general", difficulty="easy", user_level=1):
-    """Generate sentences with more variety"""
+# Curated sentences and spelling words; the LLM only adds fresh ones on top
+bank = load_content_bank(llm=llm)
+# Phonetic keys for every word the app can ask for, so scoring is a lookup
+index_vocabulary(itertools.chain(bank.all_sentences(), bank.all_words()))
+
+# Sentences (or words) in one stage
+STAGE_SIZE = 5
+
+def resolve_repeat_difficulty(difficulty="easy", user_level=1):
+    """Difficulty actually used for a Repeat-After-Me request at this level"""
     
     if user_level <= 2:
         actual_difficulty = "easy"
@@ -285,161 +287,58 @@ def generate_repeat_sentence(category="general", difficulty="easy", user_level=1
         actual_difficulty = difficulty
     else:
         actual_difficulty = "hard" if difficulty == "hard" else difficulty
-    
-    word_limits = {
-        "easy": "3 to 5 words",
-        "medium": "6 to 9 words",
-        "hard": "10 to 15 words"
-    }
-   
-    category_details = {
-        "general": {
-            "description": "everyday activities, common objects, and simple actions",
-            "easy": ["I love ice cream", "The sun is bright", "Mom reads books", "Birds sing songs", 
-                    "We play games", "Rain feels cold", "Trees are tall", "Flowers smell nice"],
-            "medium": ["I brush my teeth every morning", "The blue sky looks very beautiful",
-                      "My friend helps me with homework", "We watch movies on weekends",
-                      "The library has many books", "I practice piano after school"],
-            "hard": ["My favorite hobby is drawing colorful pictures in my notebook",
-                    "Every evening I help my mother prepare delicious dinner for the family",
-                    "During summer vacation we visit interesting places and take lots of photos"]
-        },
-        "animals": {
-            "description": "animals, pets, wildlife, and their behaviors",
-            "easy": ["Dogs can bark loudly", "Cats like to sleep", "Birds fly very high", 
-                    "Fish swim in water", "Horses run so fast", "Monkeys climb trees",
-                    "Rabbits hop around", "Butterflies are pretty"],
-            "medium": ["My rabbit eats fresh carrots daily", "The elephant has a very long trunk",
-                      "Dolphins are intelligent marine mammals", "Penguins waddle on the ice",
-                      "The lion is called king of the jungle", "Owls can see in the dark"],
-            "hard": ["The playful dolphin jumps high above the sparkling blue ocean waves",
-                    "Hummingbirds flap their tiny wings incredibly fast while drinking sweet nectar",
-                    "Baby kangaroos stay safe inside their mother's warm pouch until they grow bigger"]
-        },
-        "food": {
-            "description": "food items, meals, fruits, vegetables, and cooking",
-            "easy": ["Pizza tastes really good", "I drink fresh milk", "Apples are so sweet",
-                    "Cookies are yummy", "Soup is very hot", "Bread smells nice",
-                    "Oranges are juicy", "Rice is white"],
-            "medium": ["I eat healthy vegetables every single day", "My mom makes delicious chocolate cookies",
-                      "Fresh fruit salad contains vitamins and minerals", "We bake birthday cakes together",
-                      "Breakfast is the most important meal", "I prefer grilled chicken over fried"],
-            "hard": ["For breakfast I enjoy eating scrambled eggs with crispy golden toast",
-                    "My grandmother's homemade lasagna recipe has been passed down through generations",
-                    "A balanced diet includes proteins vegetables fruits grains and dairy products daily"]
-        },
-        "sports": {
-            "description": "sports, games, physical activities, and exercise",
-            "easy": ["I can run fast", "Soccer is so fun", "We play basketball well",
-                    "Swimming is cool", "I kick the ball", "Tennis needs a racket",
-                    "Cycling is healthy", "Dancing makes me happy"],
-            "medium": ["My sister swims in the pool today", "I practice tennis with my best friend",
-                      "Basketball requires teamwork and coordination", "Running marathons needs lots of training",
-                      "Gymnastics helps improve flexibility and balance", "Cricket is popular in many countries"],
-            "hard": ["Every morning I ride my bicycle to the park with my friends",
-                    "Professional athletes train rigorously for many hours every single day of the week",
-                    "Playing team sports teaches important life skills like cooperation communication and leadership"]
-        },
-        "feelings": {
-            "description": "emotions, feelings, moods, and personal expressions",
-            "easy": ["I feel very happy", "She looks quite sad", "We are so excited",
-                    "He seems angry", "They feel scared", "I am so proud",
-                    "She is very calm", "We feel grateful"],
-            "medium": ["My brother feels proud of his work", "I am really nervous about the test",
-                      "Everyone felt disappointed when it rained", "Kindness makes people feel appreciated",
-                      "I was surprised by the unexpected gift", "She remained confident during the competition"],
-            "hard": ["When my friends visit me I always feel extremely happy and joyful",
-                    "Understanding and managing our emotions effectively helps us maintain healthy relationships",
-                    "Sometimes feeling sad or disappointed is completely normal and helps us grow stronger"]
-        },
-        "colors": {
-            "description": "colors, shapes, sizes, and visual descriptions",
-            "easy": ["The car is red", "I see yellow flowers", "Her dress looks blue",
-                    "Grass is green", "Snow is white", "The night is dark",
-                    "Carrots are orange", "Grapes are purple"],
-            "medium": ["The rainbow has many beautiful bright colors", "My new backpack is dark purple color",
-                      "Autumn leaves turn golden yellow and orange", "The sunset painted the sky pink",
-                      "Different shades of blue represent various moods", "Artists mix colors to create new ones"],
-            "hard": ["The gigantic orange pumpkin sits in our garden looking absolutely magnificent",
-                    "Fashion designers carefully select complementary colors to create stunning visual combinations",
-                    "Understanding color theory helps artists painters and designers create more appealing artwork"]
-        },
-        "family": {
-            "description": "family members, relatives, friends, and relationships",
-            "easy": ["Dad helps me learn", "I love my sister", "Grandma tells great stories",
-                    "Mom cooks dinner", "My brother is funny", "Uncle visits often",
-                    "Aunt is kind", "Cousins play together"],
-            "medium": ["My cousin visits us every summer vacation", "Uncle Tom teaches me how to swim",
-                      "Grandparents share wisdom from their experiences", "Family traditions bring everyone closer together",
-                      "Siblings sometimes argue but always make up", "Extended family gatherings are always fun"],
-            "hard": ["On weekends my whole family enjoys eating dinner together at the table",
-                    "Family bonds grow stronger when we spend quality time communicating and supporting each other",
-                    "Multi-generational households allow grandparents parents and children to learn from one another"]
-        },
-        "school": {
-            "description": "school activities, learning, education, and classroom experiences",
-            "easy": ["I like my teacher", "Math class is fun", "We learn new things",
-                    "Books are helpful", "Friends are nice", "Lunch is tasty",
-                    "Science is interesting", "Art is creative"],
-            "medium": ["My favorite subject in school is science", "I always do my homework after school",
-                      "Teachers help students understand difficult concepts", "Group projects teach collaboration skills",
-                      "Libraries provide resources for research", "Physical education keeps students active"],
-            "hard": ["During art class we create beautiful paintings using watercolors and special brushes",
-                    "Effective study habits include regular practice active participation and asking questions when confused",
-                    "Modern classrooms use technology like computers tablets and interactive whiteboards to enhance learning"]
-        }
-    }
+    if actual_difficulty not in WORD_LIMITS:
+        actual_difficulty = "easy"
+    return actual_difficulty
+
+def repeat_sentence_prompt(category="general", difficulty="easy", user_level=1, count=STAGE_SIZE):
+    """Prompt for a batch of practice sentences, plus the difficulty used"""
+    actual_difficulty = resolve_repeat_difficulty(difficulty, user_level)
    
-    category_info = category_details.get(category, category_details["general"])
-    category_context = category_info["description"]
-    word_limit = word_limits.get(actual_difficulty, "3 to 5 words")
-    examples = category_info.get(actual_difficulty, category_info.get("easy", []))
+    category_context = bank.description(category)
+    low, high = WORD_LIMITS[actual_difficulty]
+    word_limit = f"{low} to {high} words"
+    # Examples that match the requested length, so the model sees what is wanted
+    examples = bank.sentences_between(category, low, high) or bank.sentences(category, actual_difficulty)
     
     if len(examples) > 3:
         examples = random.sample(examples, 3)
     
     if not examples or len(examples) < 3:
         examples = ["I like to play", "The sun is bright", "We have fun together"]
-    
-    variety_seed = datetime.now().microsecond % 100
 
     prompt = f"""You are an expert English teacher for children aged 6 to 15.
 
-TASK: Create ONE UNIQUE, simple, natural sentence for speaking practice.
+TASK: Create {count} UNIQUE, simple, natural sentences for speaking practice.
 
 CATEGORY: {category_context}
 DIFFICULTY: {actual_difficulty}
-WORD COUNT: Must be {word_limit}
+WORD COUNT: Each sentence must be {word_limit}
 USER LEVEL: {user_level}
 
 CRITICAL RULES FOR VARIETY:
-1. DO NOT repeat common phrases
+1. Every sentence must be DIFFERENT from the others
 2. Use DIFFERENT sentence structures
 3. Vary subjects and verbs
 4. Be creative and unexpected
-5. Return ONLY the sentence - no quotes, punctuation, or extra text
-6. Make it natural and interesting
-7. Use present, past, or future tense (vary this!)
-8. Be creative and original!
-
-VARIETY SEED: {variety_seed}
+5. Write ONE sentence per line - no numbering, quotes, punctuation, or extra text
+6. Make them natural and interesting
+7. Mix present, past, and future tense
+8. Do not copy the examples
 
 GOOD EXAMPLES for {category} ({actual_difficulty}):
 - {examples[0]}
 - {examples[1]}
 - {examples[2]}
 
-Now create ONE COMPLETELY NEW AND DIFFERENT sentence."""
+Now write {count} COMPLETELY NEW AND DIFFERENT sentences, one per line."""
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.95,
-        top_p=0.95,
-        max_tokens=60
-    )
+    return prompt, actual_difficulty
 
-    sentence = response.choices[0].message.content.strip()
+def clean_generated_sentence(text):
+    """Strip numbering, quotes and end punctuation from a generated practice sentence"""
+    sentence = text.strip()
+    sentence = re.sub(r'^(\d+[.):]|[-*\u2022])\s*', '', sentence)
     sentence = re.sub(r'^["\']+|["\']+$', '', sentence)
     sentence = re.sub(r'[.!?;:,]+$', '', sentence)
     sentence = sentence.strip()
@@ -449,8 +348,100 @@ Now create ONE COMPLETELY NEW AND DIFFERENT sentence."""
    
     return sentence
 
-def generate_spell_word(difficulty="easy", user_level=1):
-    """Generate words with variety"""
+def parse_sentence_batch(text, actual_difficulty, avoid=()):
+    """Clean a batch reply, keeping unique sentences within the word limit"""
+    low, high = WORD_LIMITS[actual_difficulty]
+    seen = {sentence.lower() for sentence in avoid}
+    sentences = []
+    for line in text.split("\n"):
+        sentence = clean_generated_sentence(line)
+        if not sentence or sentence.lower() in seen:
+            continue
+        if not low <= len(sentence.split()) <= high:
+            continue
+        seen.add(sentence.lower())
+        sentences.append(sentence)
+    return sentences
+
+def top_up_sentences(user_id, sentences, category, actual_difficulty, count, avoid=()):
+    """Fill a short batch with bank sentences this user has not had recently"""
+    if len(sentences) >= count:
+        return sentences
+    return sentences + bank.sample_sentences(user_id, category, actual_difficulty,
+                                             count - len(sentences), list(sentences) + list(avoid))
+
+# The steps around the LLM call are shared with the async routes in asgi.py,
+# which make the same call on the event loop: plan_* gives the prompt and
+# options (or None when no call is needed), finish_* turns the reply (None
+# if the LLM was unavailable) into the result.
+def plan_repeat_sentences(user_id, category="general", difficulty="easy", user_level=1, count=STAGE_SIZE, avoid=()):
+    """(prompt, LLM options, actual difficulty) for a stage; the prompt is None when the bank serves it.
+
+    The LLM is also asked when the bank can't fill the stage with sentences this user hasn't seen.
+    """
+    actual_difficulty = resolve_repeat_difficulty(difficulty, user_level)
+    if not bank.wants_fresh() and (not bank.llm_available() or
+                                   bank.unseen_sentences(user_id, category, actual_difficulty, avoid) >= count):
+        return None, None, actual_difficulty
+    prompt, actual_difficulty = repeat_sentence_prompt(category, difficulty, user_level, count)
+    return prompt, {"temperature": 0.95, "top_p": 0.95, "max_tokens": 40 * count}, actual_difficulty
+
+def finish_repeat_sentences(user_id, reply, category, actual_difficulty, count=STAGE_SIZE, avoid=()):
+    """The stage's sentences: those parsed from the LLM reply, topped up from the bank"""
+    sentences = parse_sentence_batch(reply, actual_difficulty, avoid) if reply else []
+    return top_up_sentences(user_id, sentences, category, actual_difficulty, count, avoid)
+
+def generate_repeat_sentences(user_id, category="general", difficulty="easy", user_level=1, count=STAGE_SIZE, avoid=()):
+    """A whole stage of sentences: from the bank, or one LLM call for fresh ones"""
+    prompt, options, actual_difficulty = plan_repeat_sentences(user_id, category, difficulty, user_level,
+                                                               count, avoid)
+    reply = None
+    if prompt:
+        try:
+            reply = llm.complete(prompt, **options)
+        except LLMUnavailable as e:
+            # Offline fallback: serve bank sentences (their audio is pre-rendered)
+            print(f"Error generating sentences: {e}")
+    return finish_repeat_sentences(user_id, reply, category, actual_difficulty, count, avoid)
+
+def make_repeat_item(key, sentence):
+    """A ready-to-serve Repeat-After-Me item with both audio clips"""
+    return {
+        "sentence": sentence,
+        "audio": audio_for(sentence, slow=False),
+        "audio_slow": audio_for(sentence, slow=True)
+    }
+
+def queued_sentences(key):
+    """Sentences already waiting in the prefetch pool for key, so a new stage doesn't repeat them"""
+    return [item["sentence"] for item in sentence_pool.queued(key)]
+
+def produce_repeat_sentences(key):
+    """Prefetch producer: key is (user_id, category, difficulty, user_level)"""
+    return generate_repeat_sentences(*key, avoid=queued_sentences(key))
+
+# Upcoming sentences per (user, category, difficulty, level), rendered while the child speaks
+sentence_pool = PrefetchPool(produce_repeat_sentences, background_executor, prepare=make_repeat_item,
+                             depth=int(os.getenv("PREFETCH_DEPTH", str(STAGE_SIZE))))
+
+def user_level_for(user_id):
+    """Level of a logged-in student, 1 for guests"""
+    if not user_id:
+        return 1
+    user_data = store.get_user(user_id) or {}
+    return user_data.get('level', 1)
+
+def repeat_sentence_request(data, user_id):
+    """(prefetch key, ready item or None) for a /repeat_sentence request body"""
+    key = (user_id, data.get("category", "general"), data.get("difficulty", "easy"), user_level_for(user_id))
+    return key, sentence_pool.pop(key)
+
+def spell_word_request(data, user_id):
+    """The next word for a /spell_word request body"""
+    return generate_spell_word(data.get("difficulty", "easy"), user_level_for(user_id), user_id)
+
+def generate_spell_word(difficulty="easy", user_level=1, user_id=None):
+    """Next spelling word from the bank, without repeats for this user"""
     
     if user_level <= 2:
         actual_difficulty = "easy"
@@ -459,40 +450,14 @@ def generate_spell_word(difficulty="easy", user_level=1):
     else:
         actual_difficulty = difficulty
     
-    word_pools = {
-        "easy": [
-            "cat", "dog", "sun", "moon", "tree", "fish", "bird", "house", "book", "star",
-            "ball", "cake", "milk", "rain", "snow", "wind", "fire", "door", "hand", "foot",
-            "head", "nose", "eyes", "hair", "bike", "boat", "car", "bus", "lamp", "bell",
-            "desk", "chair", "plant", "flower", "grass", "cloud", "smile", "happy", "jump", "sing"
-        ],
-        "medium": [
-            "elephant", "butterfly", "rainbow", "mountain", "ocean", "garden", "kitchen", "bedroom",
-            "library", "hospital", "balloon", "chocolate", "sandwich", "umbrella", "telephone",
-            "computer", "bicycle", "monkey", "giraffe", "pencil", "notebook", "beautiful",
-            "wonderful", "excellent", "surprise", "remember", "favorite", "together", "tomorrow",
-            "yesterday", "adventure", "question", "answer", "different", "important", "birthday",
-            "holiday", "vacation", "celebration", "gratitude"
-        ],
-        "hard": [
-            "magnificent", "extraordinary", "intelligence", "temperature", "environment",
-            "photography", "responsibility", "appreciate", "participate", "communicate",
-            "imagination", "encyclopedia", "sophisticated", "achievement", "opportunity",
-            "enthusiasm", "independent", "understand", "comfortable", "accomplish",
-            "neighborhood", "refrigerator", "pronunciation", "explanation", "demonstration",
-            "disappointed", "embarrassed", "fortunately", "unfortunately", "particularly",
-            "absolutely", "actually", "basically", "completely", "definitely", "especially",
-            "immediately", "necessary", "obviously", "seriously"
-        ]
-    }
-    
-    word_list = word_pools.get(actual_difficulty, word_pools["easy"])
-    word = random.choice(word_list)
-    
-    return word.lower()
+    return bank.sample_word(user_id, actual_difficulty)
 
-def get_word_sentence_usage(word):
-    """Generate varied example sentences"""
+def fallback_usage_sentence(word):
+    """Offline usage line for a word (its audio is pre-rendered)"""
+    return f"Can you spell the word {word}"
+
+def usage_sentence_prompt(word):
+    """Prompt for one example sentence using word"""
     
     sentence_patterns = [
         f"Use the word in a sentence about daily life",
@@ -519,21 +484,98 @@ RULES:
 8. Vary tenses
 
 Now create a NEW, DIFFERENT sentence using "{word}"."""
+    return prompt
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.8,
-        max_tokens=50
-    )
+def clean_usage_sentence(text):
+    return re.sub(r'^["\']+|["\']+$', '', text.strip())
 
-    sentence = response.choices[0].message.content.strip()
-    sentence = re.sub(r'^["\']+|["\']+$', '', sentence)
-   
-    return sentence
+USAGE_SENTENCE_OPTIONS = {"temperature": 0.8, "max_tokens": 50}
 
-def get_word_meaning(word):
-    prompt = f"""You are an English teacher explaining word meanings to children aged 6 to 15.
+def generate_usage_sentence(word):
+    """One fresh usage sentence from the LLM, or None when it is unavailable"""
+    if not bank.llm_available():
+        return None
+    prompt = usage_sentence_prompt(word)
+
+    try:
+        return clean_usage_sentence(llm.complete(prompt, **USAGE_SENTENCE_OPTIONS))
+    except LLMUnavailable as e:
+        print(f"Error generating usage sentence: {e}")
+        return None
+
+# K rotating usage sentences per word, with audio, shared by every worker
+usage_cache = UsageCache(os.getenv("USAGE_CACHE_PATH", os.getenv("DATABASE_PATH", "smartspeak.db")))
+usage_refilling = set()
+usage_refilling_lock = threading.Lock()
+
+def remember_usage(word, usage):
+    """Render a fresh usage sentence and keep it as a variant; returns the audio URL"""
+    audio = audio_for(usage, slow=False)
+    usage_cache.add(word, usage, audio)
+    return audio
+
+def fill_usage_variants(word):
+    """Generate usage sentences until word has a full set of variants"""
+    try:
+        # Bounded, so a model that keeps repeating itself can't loop forever
+        for _ in range(usage_cache.variants * 2):
+            if usage_cache.needs(word) == 0:
+                break
+            usage = generate_usage_sentence(word)
+            if not usage:
+                break
+            remember_usage(word, usage)
+    except Exception as e:
+        print(f"Error refilling usage sentences for {word}: {e}")
+    finally:
+        with usage_refilling_lock:
+            usage_refilling.discard(word)
+
+def refill_usage(word):
+    """Top up word's variants in the background when they run low"""
+    with usage_refilling_lock:
+        if word in usage_refilling or usage_cache.needs(word) == 0:
+            return
+        usage_refilling.add(word)
+    background_executor.submit(fill_usage_variants, word)
+
+def cached_usage(word):
+    """(usage, audio) from the rotating variants, or None; schedules a refill if needed"""
+    variant = usage_cache.take(word)
+    refill_usage(word)
+    if variant is None:
+        return None
+    usage, audio = variant
+    return usage, still_on_disk(audio, usage)
+
+def usage_for(word):
+    """Usage sentence and its audio: a cached variant, or one live call on a cold word"""
+    cached = cached_usage(word)
+    if cached:
+        return cached
+    return finish_usage(word, generate_usage_sentence(word))
+
+def finish_usage(word, usage):
+    """(usage, audio) for a freshly generated sentence, or the offline fallback when usage is None"""
+    if not usage:
+        fallback = fallback_usage_sentence(word)
+        return fallback, audio_for(fallback, slow=False)
+    return usage, remember_usage(word, usage)
+
+def prerender_items():
+    """Every fixed sentence and word the app can speak, as (text, slow) pairs"""
+    items = []
+    for sentence in bank.all_sentences():
+        items.append((sentence, False))
+        items.append((sentence, True))
+    for word in bank.all_words():
+        items.append((word, True))
+        items.append((word, False))
+        items.append((fallback_usage_sentence(word), False))
+    return items
+
+def word_meaning_prompt(word):
+    return f"""You are an English teacher explaining word meanings to children aged 6 to 15.
 
 Word: "{word}"
 
@@ -551,33 +593,102 @@ RULES:
 5. Focus on most common meaning
 6. Keep explanations short"""
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.4,
-        max_tokens=200
-    )
+WORD_MEANING_OPTIONS = {"temperature": 0.4, "max_tokens": 200}
+
+def get_word_meaning(word):
+    # Concurrent lookups of the same word share one request
+    return llm.complete(word_meaning_prompt(word), **WORD_MEANING_OPTIONS)
 
-    return response.choices[0].message.content.strip()
+def parse_meaning_reply(meaning_response):
+    """Split a word-meaning reply into meaning, usage, type and tip"""
+    meaning = usage = word_type = tip = ""
+    for line in meaning_response.split("\n"):
+        if line.startswith("MEANING:"):
+            meaning = line.replace("MEANING:", "").strip()
+        elif line.startswith("EXAMPLE:"):
+            usage = line.replace("EXAMPLE:", "").strip()
+        elif line.startswith("TYPE:"):
+            word_type = line.replace("TYPE:", "").strip()
+        elif line.startswith("TIP:"):
+            tip = line.replace("TIP:", "").strip()
+    return {"meaning": meaning, "usage": usage, "type": word_type, "tip": tip}
+
+def canned_meaning(word):
+    """Meaning fields for when the LLM is unavailable"""
+    return {"meaning": f"I can't look up {word} right now, please try again in a minute",
+            "usage": fallback_usage_sentence(word), "type": "", "tip": "Try sounding the word out slowly"}
+
+def meaning_audio_text(word, fields):
+    return f"{word}. {fields['meaning']}. For example: {fields['usage']}. {fields['tip']}"
+
+# Looked-up meanings survive restarts and are shared by every worker;
+# editing the prompt or model changes the version and invalidates old entries
+meaning_cache = MeaningCache(os.getenv("MEANING_CACHE_PATH", os.getenv("DATABASE_PATH", "smartspeak.db")),
+                             cache_version(word_meaning_prompt("{word}"), llm.model))
+
+def cached_meaning(word):
+    """(fields, audio) from the meaning cache, or None"""
+    cached = meaning_cache.get(word)
+    if cached is None:
+        return None
+    fields, audio = cached
+    return fields, still_on_disk(audio, meaning_audio_text(word, fields))
+
+def remember_meaning(word, fields):
+    """Render the audio for a fresh meaning and cache both; returns the audio URL"""
+    audio = speak_to_file(meaning_audio_text(word, fields), slow=False)
+    if fields["meaning"]:
+        meaning_cache.put(word, fields, audio)
+    return audio
+
+def lookup_word_meaning(word):
+    """Meaning fields and audio for word, calling the LLM only on a cache miss"""
+    cached = cached_meaning(word)
+    if cached:
+        return cached
+    try:
+        reply = get_word_meaning(word)
+    except LLMUnavailable as e:
+        print(f"Error getting word meaning: {e}")
+        reply = None
+    return finish_meaning(word, reply)
+
+def finish_meaning(word, reply):
+    """Meaning fields and audio from an LLM reply, or the canned meaning when reply is None"""
+    if reply is None:
+        # Not cached, so the real meaning is fetched once the LLM is back
+        fields = canned_meaning(word)
+        return fields, speak_to_file(meaning_audio_text(word, fields), slow=False)
+    fields = parse_meaning_reply(reply)
+    return fields, remember_meaning(word, fields)
+
+def meaning_payload(word, fields, audio):
+    """/get_meaning response body"""
+    return {
+        "word": word,
+        "meaning": fields["meaning"],
+        "usage": fields["usage"],
+        "type": fields["type"],
+        "tip": fields["tip"],
+        "audio": audio
+    }
 
-def compare_words(student_text, correct_text):
-    student_words = student_text.lower().split()
-    correct_words = correct_text.lower().split()
+def compare_words(ops):
+    """Status of each expected word, plus the extra words the child said, from scored alignment ops"""
     comparison = []
-    
-    for i, correct_word in enumerate(correct_words):
-        if i < len(student_words):
-            student_word = student_words[i]
-            similarity = SequenceMatcher(None, student_word, correct_word).ratio()
-            
-            if similarity >= 0.8:
-                comparison.append({"word": correct_word, "status": "correct"})
-            else:
-                comparison.append({"word": correct_word, "status": "incorrect", "spoken": student_word})
-        else:
+    extra_words = []
+    for op, correct_word, student_word, credit in ops:
+        if op == MATCH:
+            comparison.append({"word": correct_word, "status": "correct"})
+        elif op == SUBSTITUTE:
+            comparison.append({"word": correct_word, "status": "incorrect", "spoken": student_word})
+        elif op == DELETE:
             comparison.append({"word": correct_word, "status": "missing"})
+        else:
+            # after: index in comparison of the expected word it follows (-1 before the first)
+            extra_words.append({"word": student_word, "after": len(comparison) - 1})
     
-    return comparison
+    return comparison, extra_words
 
 def compare_spelling(student_spelling, correct_word):
     student = student_spelling.lower().strip()
@@ -623,8 +734,9 @@ def login():
     
     if user_type == "teacher":
         # Teacher login
-        if user_id in teachers_db:
-            if teachers_db[user_id]['password'] == password:
+        teacher = store.get_teacher(user_id) if user_id else None
+        if teacher:
+            if teacher['password'] == password:
                 session['user_id'] = user_id
                 session['role'] = 'teacher'
                 return jsonify({"success": True, "redirect": "/teacher-dashboard"})
@@ -635,8 +747,9 @@ def login():
     else:
         # Student login
         if user_id and password:
-            if user_id in users_db:
-                if users_db[user_id]['password'] == password:
+            user = store.get_user(user_id)
+            if user:
+                if user['password'] == password:
                     session['user_id'] = user_id
                     session['role'] = 'student'
                     return jsonify({"success": True, "redirect": "/main"})
@@ -665,17 +778,16 @@ def signup():
         
         if username and password and name:
             if len(username) == 6 and len(password) == 6:
-                # Check if username already exists
-                if username in teachers_db:
+                # Username must be unique
+                created = store.create_teacher(username, {
+                    "password": password,
+                    "name": name,
+                    "role": "teacher",
+                    "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                })
+                if not created:
                     return jsonify({"success": False, "message": "Username already exists. Please choose another."})
                 else:
-                    teachers_db[username] = {
-                        "password": password,
-                        "name": name,
-                        "role": "teacher",
-                        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    save_database()
                     session['user_id'] = username
                     session['role'] = 'teacher'
                     return jsonify({"success": True, "redirect": "/teacher-dashboard"})
@@ -693,22 +805,22 @@ def signup():
         
         if user_id and password and name and student_class and division:
             if len(user_id) == 3 and user_id.isdigit():
-                if user_id in users_db:
+                student = {
+                    "password": password,
+                    "name": name,
+                    "class": student_class,
+                    "division": division,
+                    "total_xp": 0,
+                    "total_stars": 0,
+                    "level": 1,
+                    "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "last_active": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "mode_stats": {}
+                }
+                created = store.create_user(user_id, student)
+                if not created:
                     return jsonify({"success": False, "message": "User ID already exists. Please login or choose a different ID."})
                 else:
-                    users_db[user_id] = {
-                        "password": password,
-                        "name": name,
-                        "class": student_class,
-                        "division": division,
-                        "total_xp": 0,
-                        "total_stars": 0,
-                        "level": 1,
-                        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "last_active": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "mode_stats": {}
-                    }
-                    save_database()
                     session['user_id'] = user_id
                     session['role'] = 'student'
                     return jsonify({"success": True, "redirect": "/main"})
@@ -723,23 +835,17 @@ def main():
         return redirect(url_for('home'))
     
     user_id = session['user_id']
-    user_data = users_db.get(user_id, {})
-    
-    recommended_difficulty = get_difficulty_for_level(user_data.get('level', 1))
+    user_data = store.get_user(user_id) or {}
     
     current_level = user_data.get('level', 1)
-    current_xp = user_data.get('total_xp', 0)
-    xp_for_current_level = get_xp_for_level(current_level)
-    xp_for_next_level = get_xp_for_level(current_level + 1)
-    xp_in_current_level = current_xp - xp_for_current_level
-    xp_needed_for_next = xp_for_next_level - xp_for_current_level
+    recommended_difficulty = difficulty_for_level(current_level)
+    progress = level_progress(current_level, user_data.get('total_xp', 0))
     
     return render_template("main.html", 
                          user_id=user_id, 
                          user_data=user_data,
                          recommended_difficulty=recommended_difficulty,
-                         xp_in_current_level=xp_in_current_level,
-                         xp_needed_for_next=xp_needed_for_next)
+                         **progress)
 
 @app.route("/profile")
 def profile():
@@ -747,72 +853,225 @@ def profile():
         return redirect(url_for('home'))
     
     user_id = session['user_id']
-    user_data = users_db.get(user_id, {})
+    user_data = store.get_user(user_id) or {}
     
     current_level = user_data.get('level', 1)
-    current_xp = user_data.get('total_xp', 0)
-    xp_for_current_level = get_xp_for_level(current_level)
-    xp_for_next_level = get_xp_for_level(current_level + 1)
-    xp_in_current_level = current_xp - xp_for_current_level
-    xp_needed_for_next = xp_for_next_level - xp_for_current_level
+    progress = level_progress(current_level, user_data.get('total_xp', 0))
     
     return render_template("profile.html",
                          user_id=user_id,
                          user_data=user_data,
-                         xp_in_current_level=xp_in_current_level,
-                         xp_needed_for_next=xp_needed_for_next)
+                         **progress)
+
+# ---------- TEACHER DASHBOARD ----------
+# Served straight from the store on every load, so progress saved by any
+# worker shows up at once: per-class totals from one GROUP BY, and each
+# class leaderboard from the (class, division, total_xp, user_id) index,
+# reading only as many rows as the requested page needs.
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "50"))
+
+def class_key(student_class, division):
+    return f"Class {student_class}{division}"
+
+def all_class_summaries():
+    """Per-class totals for every class, following class_summaries' cursor"""
+    classes = []
+    after = None
+    while True:
+        page = store.class_summaries({}, after, 500)
+        classes.extend(page)
+        if len(page) < 500:
+            return classes
+        after = (page[-1]['class'], page[-1]['division'])
+
+def class_leaderboard(student_class, division, page=1, per_page=DASHBOARD_PAGE_SIZE):
+    """One page of a class ordered by XP, each student with their 1-based rank"""
+    offset = (page - 1) * per_page
+    rows = store.query_students({'class': student_class, 'division': division}, 'total_xp', True,
+                                None, offset + per_page)
+    students = []
+    for rank, (user_id, user) in enumerate(rows[offset:], offset + 1):
+        user.pop('password', None)
+        students.append(dict(user, user_id=user_id, rank=rank))
+    return students
 
 @app.route("/teacher-dashboard")
 def teacher_dashboard():
     if 'user_id' not in session or session.get('role') != 'teacher':
         return redirect(url_for('home'))
     
+    # One page of each class leaderboard (?class=Class 5A&page=2 pages one class)
+    classes = all_class_summaries()
+    paged_class = request.args.get("class")
+    page = max(1, request.args.get("page", 1, type=int))
     students_by_class = {}
-    total_students = 0
-    total_stars_all = 0
+    class_pages = {}
+    for summary in classes:
+        key = class_key(summary['class'], summary['division'])
+        size = summary['students']
+        pages = max(1, -(-size // DASHBOARD_PAGE_SIZE))
+        class_page = min(page, pages) if key == paged_class else 1
+        students_by_class[key] = class_leaderboard(summary['class'], summary['division'], class_page)
+        class_pages[key] = {'page': class_page, 'size': size, 'pages': pages}
     
-    for user_id, user_data in users_db.items():
-        class_key = f"Class {user_data['class']}{user_data['division']}"
-        if class_key not in students_by_class:
-            students_by_class[class_key] = []
-        students_by_class[class_key].append({
-            'user_id': user_id,
-            'name': user_data['name'],
-            'level': user_data['level'],
-            'total_xp': user_data['total_xp'],
-            'total_stars': user_data['total_stars'],
-            'last_active': user_data['last_active'],
-            'class': user_data['class'],
-            'division': user_data['division']
-        })
-        total_students += 1
-        total_stars_all += user_data['total_stars']
-    
-    for class_key in students_by_class:
-        students_by_class[class_key].sort(key=lambda x: x['total_xp'], reverse=True)
-    
-    teacher_name = teachers_db[session['user_id']]['name']
+    teacher = store.get_teacher(session['user_id'])
+    if teacher is None:
+        return redirect(url_for('home'))
+    teacher_name = teacher['name']
     
     return render_template("teacher_dashboard.html",
                          students_by_class=students_by_class,
+                         class_pages=class_pages,
                          teacher_name=teacher_name,
-                         total_students=total_students,
-                         total_classes=len(students_by_class),
-                         total_stars_all=total_stars_all)
+                         total_students=sum(summary['students'] for summary in classes),
+                         total_classes=len(classes),
+                         total_stars_all=sum(summary['total_stars'] for summary in classes))
+
+# ---------- TEACHER API ----------
+# JSON views for dashboards that page and poll instead of rendering every
+# student at once. Pages are keyset-paginated over indexed columns: pass
+# next_cursor back as ?cursor= for the next page. Responses carry an ETag,
+# so a poll with If-None-Match gets an empty 304 when nothing changed.
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Sorts whose cursor value is a number; the rest are strings
+NUMERIC_SORTS = ('total_xp', 'level', 'total_stars')
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, types=(str, str)):
+    """Cursor from a previous page, or None; raises ValueError if it is malformed
+    or its values are not of the given types"""
+    if not cursor:
+        return None
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("bad cursor")
+    if not all(isinstance(value, kind) and not isinstance(value, bool) for value, kind in zip(values, types)):
+        raise ValueError("bad cursor")
+    return values
+
+def teacher_filters():
+    """Filters shared by the teacher API endpoints, from the query string"""
+    return {
+        'class': request.args.get("class"),
+        'division': request.args.get("division"),
+        'inactive_since': request.args.get("inactive_since"),
+        'min_level': request.args.get("min_level", type=int),
+        'max_level': request.args.get("max_level", type=int),
+    }
+
+def conditional_json(payload):
+    """jsonify with an ETag, answering 304 when the client already has this version"""
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route("/api/teacher/students", methods=["GET"])
+def api_teacher_students():
+    """?class=&division=&inactive_since=&min_level=&max_level=&sort=total_xp&order=desc&limit=&cursor="""
+    if 'user_id' not in session or session.get('role') != 'teacher':
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    
+    sort = request.args.get("sort", "total_xp")
+    if sort not in STUDENT_SORT_COLUMNS:
+        return jsonify({"success": False, "message": f"sort must be one of {', '.join(STUDENT_SORT_COLUMNS)}"}), 400
+    descending = request.args.get("order", "desc") != "asc"
+    limit = min(max(1, request.args.get("limit", API_PAGE_SIZE, type=int)), API_MAX_PAGE_SIZE)
+    try:
+        after = decode_cursor(request.args.get("cursor"),
+                              (int if sort in NUMERIC_SORTS else str, str))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid cursor"}), 400
+    
+    # One extra row tells whether there is a next page
+    page = store.query_students(teacher_filters(), sort, descending, after, limit + 1)
+    students = []
+    for user_id, user in page[:limit]:
+        user.pop('password', None)
+        # Stored as '' until the first activity; the API says null
+        students.append(dict(user, user_id=user_id, last_active=user.get('last_active') or None))
+    next_cursor = None
+    if len(page) > limit:
+        last = students[-1]
+        value = last[sort]
+        if sort == 'last_active':
+            value = value or ''  # Sorted as ''
+        next_cursor = encode_cursor([value, last['user_id']])
+    
+    return conditional_json({"success": True, "students": students, "next_cursor": next_cursor})
+
+@app.route("/api/teacher/classes", methods=["GET"])
+def api_teacher_classes():
+    """Per-class totals: ?class=&division=&inactive_since=&min_level=&max_level=&limit=&cursor="""
+    if 'user_id' not in session or session.get('role') != 'teacher':
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    
+    limit = min(max(1, request.args.get("limit", API_PAGE_SIZE, type=int)), API_MAX_PAGE_SIZE)
+    try:
+        after = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid cursor"}), 400
+    
+    page = store.class_summaries(teacher_filters(), after, limit + 1)
+    classes = page[:limit]
+    next_cursor = None
+    if len(page) > limit:
+        next_cursor = encode_cursor([classes[-1]['class'], classes[-1]['division']])
+    
+    return conditional_json({"success": True, "classes": classes, "next_cursor": next_cursor})
+
+@app.route("/api/teacher/progress", methods=["GET"])
+def api_teacher_progress():
+    """Stars per day: ?user_id= for one student, or ?class=&division= for a class; &days=30&mode="""
+    if 'user_id' not in session or session.get('role') != 'teacher':
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    
+    student_id = request.args.get("user_id")
+    student_class = request.args.get("class")
+    division = request.args.get("division")
+    if not student_id and not (student_class and division):
+        return jsonify({"success": False, "message": "Give user_id, or class and division"}), 400
+    days = min(max(1, request.args.get("days", 30, type=int)), 366)
+    
+    series = attempt_log.stars_per_day(student_id, student_class, division, days, request.args.get("mode"))
+    return conditional_json({"success": True, "days": series})
+
+@app.route("/api/teacher/weakest_words", methods=["GET"])
+def api_teacher_weakest_words():
+    """Words a class misses most: ?class=&division=&days=30&limit=10&min_attempts=3"""
+    if 'user_id' not in session or session.get('role') != 'teacher':
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    
+    student_class = request.args.get("class")
+    division = request.args.get("division")
+    if not (student_class and division):
+        return jsonify({"success": False, "message": "Give class and division"}), 400
+    days = min(max(1, request.args.get("days", 30, type=int)), 366)
+    limit = min(max(1, request.args.get("limit", 10, type=int)), API_MAX_PAGE_SIZE)
+    
+    words = attempt_log.weakest_words(student_class, division, days, limit,
+                                      max(1, request.args.get("min_attempts", 3, type=int)))
+    return conditional_json({"success": True, "words": words})
 
 @app.route("/logout")
 def logout():
     user_id = session.get('user_id')
     role = session.get('role')
     
-    # UPDATED: Save progress before logout
-    if role == 'student' and user_id in users_db:
-        users_db[user_id]['last_active'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        save_database()  # Explicitly save to JSON
+    # Record last activity before logout
+    if role == 'student' and user_id:
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        store.touch_user(user_id, now)
     
     # Clear user's conversation context on logout
-    if user_id and user_id in conversation_contexts:
-        del conversation_contexts[user_id]
+    if user_id:
+        context_store.clear(user_id)
+        sentence_pool.discard_user(user_id)
+        bank.forget_user(user_id)
     
     session.pop('user_id', None)
     session.pop('role', None)
@@ -824,23 +1083,19 @@ def get_user_stats():
         return jsonify({"success": False, "message": "Not logged in"})
     
     user_id = session['user_id']
-    user_data = users_db.get(user_id, {})
+    user_data = store.get_user(user_id) or {}
     
     current_level = user_data.get('level', 1)
-    current_xp = user_data.get('total_xp', 0)
-    xp_for_current_level = get_xp_for_level(current_level)
-    xp_for_next_level = get_xp_for_level(current_level + 1)
-    xp_in_current_level = current_xp - xp_for_current_level
-    xp_needed_for_next = xp_for_next_level - xp_for_current_level
+    progress = level_progress(current_level, user_data.get('total_xp', 0))
     
     return jsonify({
         "success": True,
         "total_xp": user_data.get('total_xp', 0),
         "total_stars": user_data.get('total_stars', 0),
         "level": current_level,
-        "xp_in_current_level": xp_in_current_level,
-        "xp_needed_for_next": xp_needed_for_next,
-        "recommended_difficulty": get_difficulty_for_level(current_level)
+        "xp_in_current_level": progress['xp_in_current_level'],
+        "xp_needed_for_next": progress['xp_needed_for_next'],
+        "recommended_difficulty": difficulty_for_level(current_level)
     })
 
 # ---------- CONVERSATION & ROLEPLAY ----------
@@ -859,16 +1114,8 @@ def process():
     else:
         ai_reply = english_coach(user_text, user_id)
 
-    correct = praise = question = ""
-    for line in ai_reply.split("\n"):
-        if line.startswith("CORRECT:"):
-            correct = line.replace("CORRECT:", "").strip()
-        elif line.startswith("PRAISE:"):
-            praise = line.replace("PRAISE:", "").strip()
-        elif line.startswith("QUESTION:"):
-            question = line.replace("QUESTION:", "").strip()
-
-    final_text = f"{correct}. {praise} {question}"
+    fields = parse_coach_reply(ai_reply)
+    final_text = coach_reply_text(fields)
     audio = speak_to_file(final_text)
 
     return jsonify({
@@ -876,37 +1123,128 @@ def process():
         "audio": audio
     })
 
+@app.route("/process_stream", methods=["POST"])
+def process_stream():
+    """Like /process, but streams NDJSON events while the coach reply is generated.
+
+    Events, one JSON object per line:
+      {"type": "token", "text": ...}                       raw model output as it arrives
+      {"type": "field", "name": "correct", "value": ...}   each parsed line once complete
+      {"type": "audio", "part": "correct"|"rest", "audio": ...}
+      {"type": "done", "reply": ...} or {"type": "error", "message": ...}
+    Audio for the CORRECT line is rendered while PRAISE and QUESTION are still streaming.
+    """
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    data = request.json
+    user_text = data["text"]
+    roleplay = data.get("roleplay")
+    user_id = session['user_id']
+    mode = 'roleplay' if roleplay else 'conversation'
+    context = get_user_context(user_id, mode)
+    prompt = coach_prompt(user_text, roleplay, context)
+
+    def event(**fields):
+        return json.dumps(fields) + "\n"
+
+    canned = []
+
+    def coach_chunks():
+        """Model output, or the canned reply if the LLM is unavailable before it starts"""
+        started = False
+        try:
+            for text in llm.stream(prompt, temperature=0.7, top_p=0.9):
+                started = True
+                yield text
+        except LLMUnavailable as e:
+            if started:
+                raise
+            print(f"Error streaming coach reply: {e}")
+            canned.append(True)
+            yield canned_coach_reply()
+
+    def generate():
+        fields = {"correct": "", "praise": "", "question": ""}
+        reply = ""
+        buffer = ""
+        correct_audio = None
+        audio_sent = False
+
+        def finish_line(line):
+            nonlocal correct_audio
+            parsed = parse_coach_line(line)
+            if not parsed:
+                return None
+            fields[parsed[0]] = parsed[1]
+            if parsed[0] == "correct" and correct_audio is None:
+                correct_audio = executor.submit(speak_to_file, f"{parsed[1]}.")
+            return event(type="field", name=parsed[0], value=parsed[1])
+
+        try:
+            for text in coach_chunks():
+                reply += text
+                buffer += text
+                yield event(type="token", text=text)
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    field_event = finish_line(line)
+                    if field_event:
+                        yield field_event
+                if correct_audio is not None and not audio_sent and correct_audio.done():
+                    yield event(type="audio", part="correct", audio=correct_audio.result())
+                    audio_sent = True
+            field_event = finish_line(buffer)
+            if field_event:
+                yield field_event
+        except Exception as e:
+            print(f"Error streaming coach reply: {e}")
+            yield event(type="error", message="Sorry, something went wrong!")
+            return
+
+        if not canned:
+            remember_coach_turn(user_id, mode, user_text, reply.strip(), context)
+
+        try:
+            if correct_audio is not None and not audio_sent:
+                yield event(type="audio", part="correct", audio=correct_audio.result())
+            rest = f"{fields['praise']} {fields['question']}".strip()
+            if rest:
+                yield event(type="audio", part="rest", audio=speak_to_file(rest))
+        except Exception as e:
+            print(f"Error rendering coach audio: {e}")
+            yield event(type="error", message="Sorry, something went wrong!")
+            return
+        yield event(type="done", reply=coach_reply_text(fields))
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # ---------- REPEAT AFTER ME ----------
 @app.route("/repeat_sentence", methods=["POST"])
 def repeat_sentence():
-    data = request.json
-    category = data.get("category", "general")
-    difficulty = data.get("difficulty", "easy")
-    
-    user_level = 1
-    if 'user_id' in session:
-        user_data = users_db.get(session['user_id'], {})
-        user_level = user_data.get('level', 1)
-   
-    sentence = generate_repeat_sentence(category, difficulty, user_level)
-    audio_normal = speak_to_file(sentence, slow=False)
-    audio_slow = speak_to_file(sentence, slow=True)
-
-    return jsonify({
-        "sentence": sentence,
-        "audio": audio_normal,
-        "audio_slow": audio_slow
-    })
+    key, item = repeat_sentence_request(request.json, session.get('user_id'))
+    leftovers = []
+    if item is None:
+        # A whole stage at once (bank or one LLM call); the rest is rendered in the background
+        sentence, *leftovers = generate_repeat_sentences(*key, avoid=queued_sentences(key))
+        normal_future = executor.submit(audio_for, sentence, False)
+        slow_future = executor.submit(audio_for, sentence, True)
+        item = {
+            "sentence": sentence,
+            "audio": normal_future.result(),
+            "audio_slow": slow_future.result()
+        }
+    sentence_pool.refill(key, seeds=leftovers)
 
-@app.route("/check_repeat", methods=["POST"])
-def check_repeat():
-    data = request.json
-    student = data["student"]
-    correct = data["correct"]
-    stage_complete = data.get("stage_complete", False)
+    return jsonify(item)
 
-    score = SequenceMatcher(None, student.lower(), correct.lower()).ratio()
-    word_comparison = compare_words(student, correct)
+def score_repeat(student, correct, result=None):
+    """Feedback, score, stars and word comparison for one Repeat-After-Me attempt"""
+    # Normalized, sound-alike aware word alignment; the score feeds the same star thresholds
+    result = result or score_attempt(student, correct)
+    score = result["score"]
+    word_comparison, extra_words = compare_words(result["ops"])
 
     if score >= 0.9:
         feedback = "Perfect! Amazing pronunciation!"
@@ -921,36 +1259,49 @@ def check_repeat():
         feedback = "Keep trying! Speak slowly and clearly."
         stars = 0
 
-    # Only save progress if stage is complete (5 sentences done)
-    level_info = None
-    if stage_complete and 'user_id' in session:
-        level_info = save_user_progress(session['user_id'], stars, 'repeat')
-
-    return jsonify({
+    return {
         "feedback": feedback,
         "score": round(score * 100),
         "stars": stars,
         "word_comparison": word_comparison,
-        "level_info": level_info,
-        "stars_saved": stage_complete
-    })
+        "extra_words": extra_words
+    }
+
+def log_attempt(mode, correct, result):
+    """Add a scored attempt by the logged-in student to the attempt log"""
+    if 'user_id' not in session:
+        return
+    if mode == 'repeat':
+        words = [(word["word"], word["status"] != "correct") for word in result["word_comparison"]]
+    else:
+        words = [(result["correct_spelling"], not result["correct"])]
+    attempt_log.record(session['user_id'], mode, correct, result["score"] / 100, result["stars"],
+                       datetime.now().strftime("%Y-%m-%d %H:%M:%S"), words)
+
+@app.route("/check_repeat", methods=["POST"])
+def check_repeat():
+    data = request.json
+    stage_complete = data.get("stage_complete", False)
+    result = score_repeat(data["student"], data["correct"])
+    log_attempt('repeat', data["correct"], result)
+
+    # Only save progress if stage is complete (5 sentences done)
+    level_info = None
+    if stage_complete and 'user_id' in session:
+        level_info = save_user_progress(session['user_id'], result["stars"], 'repeat')
+
+    result["level_info"] = level_info
+    result["stars_saved"] = stage_complete
+    return jsonify(result)
 
 # ---------- SPELL BEE ----------
 @app.route("/spell_word", methods=["POST"])
 def spell_word():
-    data = request.json
-    difficulty = data.get("difficulty", "easy")
-    
-    user_level = 1
-    if 'user_id' in session:
-        user_data = users_db.get(session['user_id'], {})
-        user_level = user_data.get('level', 1)
-   
-    word = generate_spell_word(difficulty, user_level)
-    usage = get_word_sentence_usage(word)
-   
-    audio_word = speak_to_file(word, slow=True)
-    audio_sentence = speak_to_file(usage, slow=False)
+    word = spell_word_request(request.json, session.get('user_id'))
+    # The word audio does not depend on the usage sentence, so render it meanwhile
+    word_future = executor.submit(audio_for, word, True)
+    usage, audio_sentence = usage_for(word)
+    audio_word = word_future.result()
    
     return jsonify({
         "word": word,
@@ -959,19 +1310,15 @@ def spell_word():
         "audio_sentence": audio_sentence
     })
 
-@app.route("/check_spelling", methods=["POST"])
-def check_spelling():
-    data = request.json
-    student_spelling = data["spelling"]
-    correct_word = data["correct"]
-    stage_complete = data.get("stage_complete", False)
-   
+def score_spelling(student_spelling, correct_word):
+    """Feedback, stars and letter comparison for one Spell Bee attempt"""
     student = student_spelling.lower().strip()
     correct = correct_word.lower().strip()
    
     is_correct = (student == correct)
     letter_comparison = compare_spelling(student, correct)
    
+    similarity = 1.0
     if is_correct:
         feedback = "🎉 Perfect! You spelled it correctly!"
         stars = 3
@@ -987,19 +1334,81 @@ def check_spelling():
             feedback = "Try again! Listen carefully to the word."
             stars = 0
     
+    return {
+        "correct": is_correct,
+        "feedback": feedback,
+        "score": round(similarity * 100),
+        "stars": stars,
+        "letter_comparison": letter_comparison,
+        "correct_spelling": correct
+    }
+
+@app.route("/check_spelling", methods=["POST"])
+def check_spelling():
+    data = request.json
+    stage_complete = data.get("stage_complete", False)
+    result = score_spelling(data["spelling"], data["correct"])
+    log_attempt('spellbee', data["correct"], result)
+    
     # Only save progress if stage is complete (5 words done)
     level_info = None
     if stage_complete and 'user_id' in session:
-        level_info = save_user_progress(session['user_id'], stars, 'spellbee')
+        level_info = save_user_progress(session['user_id'], result["stars"], 'spellbee')
    
+    result["level_info"] = level_info
+    result["stars_saved"] = stage_complete
+    return jsonify(result)
+
+# ---------- WHOLE STAGES ----------
+# A stage is at most STAGE_SIZE items, so one call can't save more than one stage's stars
+MAX_STAGE_ATTEMPTS = STAGE_SIZE
+
+@app.route("/check_stage", methods=["POST"])
+def check_stage():
+    """Score every attempt of a stage in one call and save the stage's stars in one write.
+
+    Body: {"mode": "repeat", "attempts": [{"student": ..., "correct": ...}, ...]}
+       or {"mode": "spellbee", "attempts": [{"spelling": ..., "correct": ...}, ...]}
+    Each result is what /check_repeat or /check_spelling would return for that item.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Send a JSON object"}), 400
+    mode = data.get("mode", "repeat")
+    attempts = data.get("attempts") or []
+    if mode not in ("repeat", "spellbee"):
+        return jsonify({"error": "Unknown mode"}), 400
+    if not isinstance(attempts, list) or not attempts or len(attempts) > MAX_STAGE_ATTEMPTS:
+        return jsonify({"error": f"Send 1 to {MAX_STAGE_ATTEMPTS} attempts"}), 400
+    spoken_field = "student" if mode == "repeat" else "spelling"
+    for attempt in attempts:
+        if (not isinstance(attempt, dict) or not isinstance(attempt.get("correct"), str)
+                or not isinstance(attempt.get(spoken_field, ""), str)):
+            return jsonify({"error": f'Each attempt needs a "correct" string '
+                                     f'and an optional "{spoken_field}" string'}), 400
+
+    if mode == "repeat":
+        pairs = [(attempt.get("student", ""), attempt["correct"]) for attempt in attempts]
+        results = [score_repeat(student, correct, scored)
+                   for (student, correct), scored in zip(pairs, score_attempts(pairs))]
+    else:
+        results = [score_spelling(attempt.get("spelling", ""), attempt["correct"]) for attempt in attempts]
+
+    for attempt, result in zip(attempts, results):
+        log_attempt(mode, attempt["correct"], result)
+
+    # The stage total goes in as one progress update: one session, one write
+    total_stars = sum(result["stars"] for result in results)
+    level_info = None
+    if 'user_id' in session:
+        level_info = save_user_progress(session['user_id'], total_stars, mode)
+
     return jsonify({
-        "correct": is_correct,
-        "feedback": feedback,
-        "stars": stars,
-        "letter_comparison": letter_comparison,
-        "correct_spelling": correct,
+        "results": results,
+        "total_stars": total_stars,
+        "max_stars": 3 * len(results),
         "level_info": level_info,
-        "stars_saved": stage_complete
+        "stars_saved": 'user_id' in session
     })
 
 # ---------- WORD MEANINGS ----------
@@ -1008,30 +1417,136 @@ def get_meaning():
     data = request.json
     word = data["word"]
    
-    meaning_response = get_word_meaning(word)
+    fields, audio = lookup_word_meaning(word)
    
-    meaning = usage = word_type = tip = ""
-    for line in meaning_response.split("\n"):
-        if line.startswith("MEANING:"):
-            meaning = line.replace("MEANING:", "").strip()
-        elif line.startswith("EXAMPLE:"):
-            usage = line.replace("EXAMPLE:", "").strip()
-        elif line.startswith("TYPE:"):
-            word_type = line.replace("TYPE:", "").strip()
-        elif line.startswith("TIP:"):
-            tip = line.replace("TIP:", "").strip()
-   
-    audio_text = f"{word}. {meaning}. For example: {usage}. {tip}"
-    audio = speak_to_file(audio_text, slow=False)
-   
-    return jsonify({
-        "word": word,
-        "meaning": meaning,
-        "usage": usage,
-        "type": word_type,
-        "tip": tip,
-        "audio": audio
-    })
+    return jsonify(meaning_payload(word, fields, audio))
+
+# ---------- METRICS ----------
+@app.before_request
+def start_timer():
+    if metrics.METRICS_ENABLED:
+        g.started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.get('started')
+    if started is None:
+        return response
+    labels = {'endpoint': request.endpoint or "unknown", 'method': request.method,
+              'status': str(response.status_code)}
+
+    def observe():
+        metrics.observe("http_request_seconds", time.perf_counter() - started, **labels)
+
+    if response.is_streamed:
+        # Timed up to the last byte: the server closes the response once the generator is exhausted
+        response.call_on_close(observe)
+    else:
+        observe()
+    return response
+
+def llm_samples():
+    stats = llm.stats()
+    return [('llm_calls_total', 'counter', {}, stats['calls']),
+            ('llm_retries_total', 'counter', {}, stats['retried']),
+            ('llm_coalesced_total', 'counter', {}, stats['coalesced']),
+            ('llm_rejected_total', 'counter', {}, stats['rejected']),
+            ('llm_breaker_opens_total', 'counter', {}, stats['breaker_opens']),
+            ('llm_breaker_open', 'gauge', {}, 0 if stats['state'] == 'closed' else 1)]
+
+def queue_samples():
+    log_stats = attempt_log.stats()
+    return [('attempt_log_queued', 'gauge', {}, log_stats['queued']),
+            ('attempt_log_dropped_total', 'counter', {}, log_stats['dropped']),
+            ('prefetch_items', 'gauge', {'pool': 'repeat_sentences'}, sentence_pool.stats()['items'])]
+
+def audio_samples():
+    stats = audio_cache_stats()
+    return [('audio_cache_files', 'gauge', {}, stats['files']),
+            ('audio_cache_bytes', 'gauge', {}, stats['bytes'])]
+
+metrics.add_collector(metrics.cache_collector("repeat_sentences", sentence_pool.stats))
+metrics.add_collector(metrics.cache_collector("usage_sentences", usage_cache.stats))
+metrics.add_collector(metrics.cache_collector("meanings", meaning_cache.stats))
+metrics.add_collector(llm_samples)
+metrics.add_collector(queue_samples)
+metrics.add_collector(audio_samples)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape target (404 when METRICS_ENABLED=0)"""
+    if not metrics.METRICS_ENABLED:
+        abort(404)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# ---------- DATABASE ----------
+@app.cli.command("migrate-json")
+@click.option("--force", is_flag=True, help="Import again even if a migration already ran.")
+def migrate_json_command(force):
+    """Import users_data.json and teachers_data.json into the SQLite database."""
+    database = getattr(store, 'inner', store)
+    if not isinstance(database, SQLiteUserStore):
+        click.echo("STORAGE_BACKEND is not sqlite; nothing to migrate.")
+        return
+    students, teachers = database.migrate_from_json(force=force)
+    click.echo(f"Imported {students} students and {teachers} teachers.")
+
+# ---------- AUDIO WARM-UP ----------
+@app.cli.command("prerender-audio")
+@click.option("--workers", default=4, show_default=True, help="Parallel synthesis workers.")
+def prerender_audio_command(workers):
+    """Pre-render audio for the built-in word pools and example sentences."""
+    result = prerender(prerender_items(), workers=workers)
+    click.echo(f"Pre-rendered {result['rendered']} clips ({result['failed']} failed, "
+               f"{result['skipped']} already done).")
+
+# ---------- USAGE SENTENCE WARM-UP ----------
+@app.cli.command("warm-usage")
+@click.option("--workers", default=4, show_default=True, help="Parallel LLM lookups.")
+def warm_usage_command(workers):
+    """Fill the rotating usage sentences (and their audio) for every spell-bee word."""
+    words = sorted(set(bank.all_words()))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fill_usage_variants, words))
+    stats = usage_cache.stats()
+    click.echo(f"{stats['variants']} usage sentences cached for {stats['words']} of {len(words)} words.")
+
+# ---------- MEANING WARM-UP ----------
+@app.cli.command("warm-meanings")
+@click.option("--workers", default=4, show_default=True, help="Parallel LLM lookups.")
+def warm_meanings_command(workers):
+    """Pre-fill the word meaning cache for the spell-bee word pools."""
+    words = sorted({word for word in bank.all_words() if meaning_cache.get(word) is None})
+
+    def warm(word):
+        # Straight to the LLM: a canned fallback must neither be cached nor rendered
+        fields = parse_meaning_reply(get_word_meaning(word))
+        if not fields["meaning"]:
+            raise ValueError("reply had no MEANING line")
+        remember_meaning(word, fields)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for word, future in [(word, pool.submit(warm, word)) for word in words]:
+            try:
+                future.result()
+            except Exception as e:
+                # LLMUnavailable included
+                print(f"Error warming meaning for {word}: {e}")
+                failed += 1
+    click.echo(f"Cached {len(words) - failed} meanings ({failed} failed); {meaning_cache.stats()['entries']} in total.")
+
+@app.cli.command("purge-meanings")
+def purge_meanings_command():
+    """Delete expired meanings and meanings cached for an older prompt or model."""
+    removed = meaning_cache.purge()
+    click.echo(f"Removed {removed} meanings; {meaning_cache.stats()['entries']} left.")
+
+# Optional startup stage: PRERENDER_AUDIO=1 warms the audio in the background.
+# Only the worker that takes the pre-render lock renders; the others skip, and
+# pick up its manifest before they next evict.
+if os.getenv("PRERENDER_AUDIO") == "1":
+    threading.Thread(target=prerender, args=(prerender_items(),), kwargs={'wait': False}, daemon=True).start()
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,290 @@
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+from http.cookies import SimpleCookie
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from groq import AsyncGroq
+from itsdangerous import BadSignature
+
+import metrics
+import app as smartspeak
+from llm import LLMUnavailable
+from app import app as flask_app
+
+# ================= ASYNC SERVING MODE =================
+# ASGI entry point that runs alongside the WSGI `app:app`:
+#
+#     uvicorn asgi:app --workers 2
+#
+# The LLM/TTS-heavy routes (/process, /repeat_sentence, /spell_word,
+# /get_meaning) are served natively on the event loop: Groq calls go through
+# the shared LLM gateway on an AsyncGroq client with a pooled httpx
+# connection, and TTS/database work is offloaded to the shared executor.
+# While a request waits on Groq it holds no thread, so one process can keep
+# dozens of coaching requests in flight.
+# Every other route is passed to the Flask app on a thread pool.
+
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "100"))
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "32"))
+
+async_client = AsyncGroq(
+    api_key=os.getenv("GROQ_API_KEY"),
+    max_retries=0,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS,
+                            max_keepalive_connections=ASYNC_MAX_CONNECTIONS // 2),
+        timeout=httpx.Timeout(60.0, connect=5.0)
+    )
+)
+
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS)
+
+async def offload(func, *args):
+    """Run blocking work (TTS, database) on the shared executor"""
+    return await asyncio.get_running_loop().run_in_executor(smartspeak.executor, func, *args)
+
+# Same gateway (breaker, retries, single-flight) as the WSGI app, with an async client
+smartspeak.llm.use_async_client(async_client)
+
+async def chat(prompt, **options):
+    return await smartspeak.llm.acomplete(prompt, **options)
+
+# ================= REQUEST HELPERS =================
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    return body
+
+def session_user(scope):
+    """user_id from Flask's signed session cookie, or None"""
+    cookie_header = ""
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookie_header += value.decode("latin-1") + "; "
+    morsel = SimpleCookie(cookie_header).get(flask_app.config["SESSION_COOKIE_NAME"])
+    if morsel is None:
+        return None
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        data = serializer.loads(morsel.value,
+                                max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return data.get("user_id")
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+# ================= ASYNC ROUTES =================
+async def process(data, user_id):
+    if not user_id:
+        return 401, {"error": "Not logged in"}
+
+    user_text = data["text"]
+    roleplay = data.get("roleplay")
+    mode = 'roleplay' if roleplay else 'conversation'
+    context = await offload(smartspeak.get_user_context, user_id, mode)
+
+    try:
+        reply = await chat(smartspeak.coach_prompt(user_text, roleplay, context), temperature=0.7, top_p=0.9)
+        await offload(smartspeak.remember_coach_turn, user_id, mode, user_text, reply, context)
+    except LLMUnavailable as e:
+        print(f"Error getting coach reply: {e}")
+        reply = smartspeak.canned_coach_reply()
+
+    final_text = smartspeak.coach_reply_text(smartspeak.parse_coach_reply(reply))
+    audio = await offload(smartspeak.speak_to_file, final_text)
+    return 200, {"reply": final_text, "audio": audio}
+
+# Request parsing, bank sampling and reply handling are the Flask routes' own
+# helpers (see app.py); only the LLM call itself is awaited here
+async def repeat_sentence(data, user_id):
+    key, item = await offload(smartspeak.repeat_sentence_request, data, user_id)
+    leftovers = []
+    if item is None:
+        user_id, category, difficulty, level = key
+        avoid = smartspeak.queued_sentences(key)
+        prompt, options, actual_difficulty = smartspeak.plan_repeat_sentences(
+            user_id, category, difficulty, level, avoid=avoid)
+        reply = None
+        if prompt:
+            try:
+                reply = await chat(prompt, **options)
+            except LLMUnavailable as e:
+                print(f"Error generating sentences: {e}")
+        sentence, *leftovers = smartspeak.finish_repeat_sentences(user_id, reply, category, actual_difficulty,
+                                                                  avoid=avoid)
+
+        audio_normal, audio_slow = await asyncio.gather(
+            offload(smartspeak.audio_for, sentence, False),
+            offload(smartspeak.audio_for, sentence, True))
+        item = {"sentence": sentence, "audio": audio_normal, "audio_slow": audio_slow}
+    smartspeak.sentence_pool.refill(key, seeds=leftovers)
+    return 200, item
+
+async def spell_word(data, user_id):
+    word = await offload(smartspeak.spell_word_request, data, user_id)
+    word_audio = asyncio.ensure_future(offload(smartspeak.audio_for, word, True))
+    cached = await offload(smartspeak.cached_usage, word)
+    if cached:
+        usage, audio_sentence = cached
+    else:
+        usage = None
+        if smartspeak.bank.llm_available():
+            try:
+                usage = smartspeak.clean_usage_sentence(
+                    await chat(smartspeak.usage_sentence_prompt(word), **smartspeak.USAGE_SENTENCE_OPTIONS))
+            except LLMUnavailable as e:
+                print(f"Error generating usage sentence: {e}")
+        usage, audio_sentence = await offload(smartspeak.finish_usage, word, usage)
+    return 200, {"word": word, "usage": usage, "audio_word": await word_audio,
+                 "audio_sentence": audio_sentence}
+
+async def get_meaning(data, user_id):
+    word = data["word"]
+    cached = await offload(smartspeak.cached_meaning, word)
+    if cached:
+        fields, audio = cached
+    else:
+        try:
+            reply = await chat(smartspeak.word_meaning_prompt(word), **smartspeak.WORD_MEANING_OPTIONS)
+        except LLMUnavailable as e:
+            print(f"Error getting word meaning: {e}")
+            reply = None
+        fields, audio = await offload(smartspeak.finish_meaning, word, reply)
+    return 200, smartspeak.meaning_payload(word, fields, audio)
+
+ASYNC_ROUTES = {
+    ("POST", "/process"): process,
+    ("POST", "/repeat_sentence"): repeat_sentence,
+    ("POST", "/spell_word"): spell_word,
+    ("POST", "/get_meaning"): get_meaning,
+}
+
+# ================= WSGI BRIDGE =================
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI http scope"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def call_flask(scope, body, send):
+    """Run the Flask app on a worker thread, streaming its output back"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def put(item):
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def run():
+        status = {}
+
+        def start_response(status_line, headers, exc_info=None):
+            status["code"] = int(status_line.split(" ", 1)[0])
+            status["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        try:
+            result = flask_app(build_environ(scope, body), start_response)
+            try:
+                put(("start", status))
+                for chunk in result:
+                    if chunk:
+                        put(("body", chunk))
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+            put(("end", None))
+        except Exception as e:
+            put(("error", e))
+
+    loop.run_in_executor(wsgi_executor, run)
+    while True:
+        kind, value = await queue.get()
+        if kind == "start":
+            await send({"type": "http.response.start", "status": value["code"], "headers": value["headers"]})
+        elif kind == "body":
+            await send({"type": "http.response.body", "body": value, "more_body": True})
+        elif kind == "end":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        else:
+            raise value
+
+# ================= ASGI APP =================
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await async_client.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    body = await read_body(receive)
+    handler = ASYNC_ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        await call_flask(scope, body, send)
+        return
+
+    started = time.perf_counter()
+    try:
+        data = json.loads(body or b"{}")
+        status, payload = await handler(data, session_user(scope))
+    except (ValueError, KeyError) as e:
+        status, payload = 400, {"error": f"Bad request: {e}"}
+    except Exception as e:
+        print(f"Error in {scope['path']}: {e}")
+        status, payload = 500, {"error": "Internal server error"}
+    await send_json(send, status, payload)
+    # Same series as the Flask routes (handlers are named after their endpoints)
+    metrics.observe("http_request_seconds", time.perf_counter() - started,
+                    endpoint=handler.__name__, method=scope["method"], status=str(status))
@@ -0,0 +1,221 @@
+import os
+import atexit
+import threading
+from datetime import date, timedelta
+import metrics
+from storage import BackgroundFlusher, connect_sqlite
+
+# ================= ATTEMPT LOG =================
+# Every scored Repeat-After-Me / Spell Bee attempt is appended to the
+# `attempts` table (user, mode, item, score, stars, time). Attempts are
+# buffered in memory and written in one transaction per flush, every
+# ATTEMPT_LOG_FLUSH_INTERVAL seconds or ATTEMPT_LOG_FLUSH_BATCH attempts.
+# The same transaction keeps three daily rollups up to date:
+#   daily_student - attempts, stars and score per student, day and mode
+#   daily_class   - the same per class + division
+#   daily_words   - attempts and misses per class, day and practised word
+# The analytics queries only read the rollups, never the raw log.
+# Attempts still in the buffer show up after the next flush. While the
+# database can't be written, at most ATTEMPT_LOG_MAX_PENDING attempts are
+# kept for retry; the oldest are dropped (and counted) beyond that.
+ATTEMPT_LOG_FLUSH_INTERVAL = float(os.getenv("ATTEMPT_LOG_FLUSH_INTERVAL", "2.0"))
+ATTEMPT_LOG_FLUSH_BATCH = int(os.getenv("ATTEMPT_LOG_FLUSH_BATCH", "200"))
+ATTEMPT_LOG_MAX_PENDING = int(os.getenv("ATTEMPT_LOG_MAX_PENDING", "10000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    item TEXT NOT NULL,
+    score REAL NOT NULL,
+    stars INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_user ON attempts (user_id, created_at);
+CREATE TABLE IF NOT EXISTS daily_student (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    stars INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (user_id, day, mode)
+);
+CREATE TABLE IF NOT EXISTS daily_class (
+    class TEXT NOT NULL,
+    division TEXT NOT NULL,
+    day TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    stars INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (class, division, day, mode)
+);
+CREATE TABLE IF NOT EXISTS daily_words (
+    class TEXT NOT NULL,
+    division TEXT NOT NULL,
+    day TEXT NOT NULL,
+    word TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    misses INTEGER NOT NULL,
+    PRIMARY KEY (class, division, day, word)
+);
+"""
+
+class AttemptLog:
+    """Buffered attempt log with daily rollups, in a SQLite file shared by every worker.
+
+    class_of(user_id) gives a student's (class, division), or None; it is
+    called once per student per flush.
+    """
+
+    def __init__(self, path, class_of, interval=ATTEMPT_LOG_FLUSH_INTERVAL, batch_size=ATTEMPT_LOG_FLUSH_BATCH,
+                 max_pending=ATTEMPT_LOG_MAX_PENDING):
+        self.path = path
+        self.class_of = class_of
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.pending = []
+        self.flusher = BackgroundFlusher(self.flush, interval)
+        self.written = 0
+        self.dropped = 0
+        self.connect().executescript(SCHEMA)
+        atexit.register(self.flush)
+
+    def connect(self):
+        return connect_sqlite(self.local, self.path)
+
+    # ---------- WRITING ----------
+    def record(self, user_id, mode, item, score, stars, now, words=()):
+        """Queue one attempt: score is 0..1, now a "%Y-%m-%d %H:%M:%S" timestamp,
+        words the (word, missed) outcomes of the words practised in it"""
+        with self.lock:
+            self.pending.append((user_id, mode, item, score, stars, now, tuple(words)))
+            self._trim()
+            queued = len(self.pending)
+            self.flusher.start()
+        if queued >= self.batch_size:
+            self.flusher.wake()
+
+    def flush(self):
+        """Append the buffered attempts and fold them into the rollups, in one transaction"""
+        with self.lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, []
+        try:
+            with metrics.timed("store_write_seconds", op="attempt_log"):
+                self._write(batch)
+            self.written += len(batch)
+        except Exception as e:
+            print(f"Error writing attempt log: {e}")
+            with self.lock:
+                self.pending = batch + self.pending
+                self._trim()
+
+    def _trim(self):
+        """Drop the oldest attempts beyond max_pending (caller holds the lock)"""
+        overflow = len(self.pending) - self.max_pending
+        if overflow > 0:
+            del self.pending[:overflow]
+            self.dropped += overflow
+            print(f"Attempt log buffer full: dropped {overflow} attempts ({self.dropped} so far)")
+
+    def _write(self, batch):
+        classes = {}
+        students, class_days, words = {}, {}, {}
+        for user_id, mode, item, score, stars, now, outcomes in batch:
+            day = now[:10]
+            _add(students, (user_id, day, mode), (1, stars, score))
+            if user_id not in classes:
+                classes[user_id] = self.class_of(user_id)
+            if classes[user_id] is None:
+                continue
+            student_class, division = (str(part) for part in classes[user_id])
+            _add(class_days, (student_class, division, day, mode), (1, stars, score))
+            for word, missed in outcomes:
+                _add(words, (student_class, division, day, word), (1, 1 if missed else 0))
+
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT INTO attempts (user_id, mode, item, score, stars, created_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", [attempt[:6] for attempt in batch])
+            conn.executemany(
+                "INSERT INTO daily_student (user_id, day, mode, attempts, stars, score) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, day, mode) DO UPDATE SET attempts = attempts + excluded.attempts, "
+                "stars = stars + excluded.stars, score = score + excluded.score",
+                [key + tuple(totals) for key, totals in students.items()])
+            conn.executemany(
+                "INSERT INTO daily_class (class, division, day, mode, attempts, stars, score) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (class, division, day, mode) DO UPDATE SET attempts = attempts + excluded.attempts, "
+                "stars = stars + excluded.stars, score = score + excluded.score",
+                [key + tuple(totals) for key, totals in class_days.items()])
+            conn.executemany(
+                "INSERT INTO daily_words (class, division, day, word, attempts, misses) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (class, division, day, word) DO UPDATE SET attempts = attempts + excluded.attempts, "
+                "misses = misses + excluded.misses",
+                [key + tuple(totals) for key, totals in words.items()])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---------- ANALYTICS ----------
+    def stars_per_day(self, user_id=None, student_class=None, division=None, days=30, mode=None, today=None):
+        """[{'day', 'attempts', 'stars', 'average_score'}] for each of the last `days` days, oldest first.
+
+        For one student (user_id) or one class (student_class + division).
+        """
+        today = today or date.today()
+        first = today - timedelta(days=days - 1)
+        if user_id is not None:
+            sql = "SELECT day, SUM(attempts), SUM(stars), SUM(score) FROM daily_student WHERE user_id = ?"
+            params = [user_id]
+        else:
+            sql = ("SELECT day, SUM(attempts), SUM(stars), SUM(score) FROM daily_class "
+                   "WHERE class = ? AND division = ?")
+            params = [str(student_class), str(division)]
+        sql += " AND day BETWEEN ? AND ?"
+        params += [first.isoformat(), today.isoformat()]
+        if mode:
+            sql += " AND mode = ?"
+            params.append(mode)
+        totals = {row[0]: row[1:] for row in self.connect().execute(sql + " GROUP BY day", params)}
+
+        series = []
+        for offset in range(days):
+            day = (first + timedelta(days=offset)).isoformat()
+            attempts, stars, score = totals.get(day, (0, 0, 0.0))
+            series.append({'day': day, 'attempts': attempts, 'stars': stars,
+                           'average_score': round(score / attempts, 3) if attempts else None})
+        return series
+
+    def weakest_words(self, student_class, division, days=30, limit=10, min_attempts=3, today=None):
+        """[{'word', 'attempts', 'misses', 'miss_rate'}] a class missed most often in the last `days` days"""
+        today = today or date.today()
+        first = today - timedelta(days=days - 1)
+        rows = self.connect().execute(
+            "SELECT word, SUM(attempts) AS attempts, SUM(misses) AS misses FROM daily_words "
+            "WHERE class = ? AND division = ? AND day BETWEEN ? AND ? GROUP BY word "
+            "HAVING SUM(attempts) >= ? AND SUM(misses) > 0 "
+            "ORDER BY 1.0 * SUM(misses) / SUM(attempts) DESC, SUM(misses) DESC, word LIMIT ?",
+            (str(student_class), str(division), first.isoformat(), today.isoformat(), min_attempts, limit))
+        return [{'word': row['word'], 'attempts': row['attempts'], 'misses': row['misses'],
+                 'miss_rate': round(row['misses'] / row['attempts'], 3)} for row in rows]
+
+    def stats(self):
+        with self.lock:
+            queued = len(self.pending)
+        return {'queued': queued, 'written': self.written, 'dropped': self.dropped}
+
+def _add(totals, key, values):
+    """Element-wise running sum of values under key"""
+    if key in totals:
+        totals[key] = [total + value for total, value in zip(totals[key], values)]
+    else:
+        totals[key] = list(values)
@@ -0,0 +1,90 @@
+"""Benchmark the alignment-based word comparison against the old positional one.
+
+    python benchmarks/alignment_bench.py [--rounds 2000]
+"""
+import os
+import sys
+import timeit
+import argparse
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alignment
+from alignment import align_words, ratio
+
+# ---------- PREVIOUS IMPLEMENTATION ----------
+def legacy_compare_words(student_text, correct_text):
+    student_words = student_text.lower().split()
+    correct_words = correct_text.lower().split()
+    comparison = []
+
+    for i, correct_word in enumerate(correct_words):
+        if i < len(student_words):
+            student_word = student_words[i]
+            similarity = SequenceMatcher(None, student_word, correct_word).ratio()
+
+            if similarity >= 0.8:
+                comparison.append({"word": correct_word, "status": "correct"})
+            else:
+                comparison.append({"word": correct_word, "status": "incorrect", "spoken": student_word})
+        else:
+            comparison.append({"word": correct_word, "status": "missing"})
+
+    return comparison
+
+def legacy_check(student, correct):
+    return SequenceMatcher(None, student.lower(), correct.lower()).ratio(), legacy_compare_words(student, correct)
+
+def aligned_check(student, correct):
+    return ratio(student.lower(), correct.lower()), align_words(student.lower().split(), correct.lower().split())
+
+# (spoken, expected) pairs: exact, mispronounced, an inserted word, a dropped word
+CASES = {
+    "easy": ("Dogs can bark loud", "Dogs can bark loudly"),
+    "medium": ("The elephant has a very very long trunk", "The elephant has a very long trunk"),
+    "hard": ("The playful dolphin jump high above sparkling blue ocean waves today",
+             "The playful dolphin jumps high above the sparkling blue ocean waves"),
+    "hard-15": ("Baby kangaroo stay safe inside there mother warm pouch until they grow much bigger now",
+                "Baby kangaroos stay safe inside their mother's warm pouch until they grow bigger and stronger"),
+}
+
+def clear_caches():
+    alignment.words_match.cache_clear()
+    if alignment._levenshtein_opcodes is not None:
+        alignment._matches.cache_clear()
+
+def run(rounds):
+    print(f"{'case':<10}{'words':>6}{'legacy us':>12}{'aligned us':>12}{'cold us':>10}{'speedup':>9}")
+    for name, (spoken, expected) in CASES.items():
+        legacy = timeit.timeit(lambda: legacy_check(spoken, expected), number=rounds) / rounds
+        aligned = timeit.timeit(lambda: aligned_check(spoken, expected), number=rounds) / rounds
+
+        # Without the word-match caches, as for a sentence seen for the first time
+        def cold():
+            clear_caches()
+            aligned_check(spoken, expected)
+        cold_time = timeit.timeit(cold, number=rounds) / rounds
+
+        print(f"{name:<10}{len(expected.split()):>6}{legacy * 1e6:>12.1f}{aligned * 1e6:>12.1f}"
+              f"{cold_time * 1e6:>10.1f}{legacy / aligned:>8.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    if alignment._levenshtein_opcodes is not None:
+        print("== rapidfuzz ==")
+        run(args.rounds)
+        alignment._rapidfuzz_ratio = alignment._rapidfuzz_extract = alignment._levenshtein_opcodes = None
+        clear_caches()
+    print("== pure Python ==")
+    run(args.rounds)
+
+    spoken, expected = CASES["hard"]
+    print("\nlegacy :", [(w["word"], w["status"]) for w in legacy_compare_words(spoken, expected)])
+    print("aligned:", [(op, e, s) for op, e, s in align_words(spoken.lower().split(), expected.lower().split())])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""A local stand-in for the Groq chat completions API, for load tests.
+
+    python benchmarks/fake_groq.py [--port 8099] [--latency 0.3] [--jitter 0.2] [--error-rate 0]
+
+Point the app at it with GROQ_BASE_URL=http://127.0.0.1:8099 (any GROQ_API_KEY).
+Replies are recognised from the app's prompts (coach, sentence batch, usage
+sentence, word meaning) and are in the format the app parses. Each request
+waits `latency` seconds, give or take `jitter` (a fraction of it); streamed
+replies spend half of that before the first token.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ["the", "happy", "dog", "runs", "in", "park", "my", "sister", "reads", "a", "big", "book",
+         "we", "play", "ball", "after", "school", "every", "sunny", "day", "with", "friends",
+         "little", "cat", "sleeps", "on", "warm", "red", "mat", "near", "window"]
+
+class FakeGroq:
+    """Latency, error injection and canned replies shared by every request"""
+
+    def __init__(self, latency=0.3, jitter=0.2, error_rate=0.0, seed=7):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def draw(self):
+        """(delay, fail, shuffled words) for one request"""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency * (1 + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+            words = self.random.sample(WORDS, len(WORDS))
+        return max(0.0, delay), fail, words
+
+    def reply(self, prompt, words):
+        """Text the app can parse for the prompt it sent"""
+        if "CORRECT:" in prompt:
+            return ("CORRECT: I like to play in the park\n"
+                    "PRAISE: Wonderful speaking!\n"
+                    "QUESTION: What is your favourite game?")
+        if "MEANING:" in prompt:
+            word = re.search(r'Word: "([^"]*)"', prompt)
+            word = word.group(1) if word else "word"
+            return (f"MEANING: {word} is a word children use every day.\n"
+                    f"EXAMPLE: I can say {word} in a sentence.\n"
+                    "TYPE: noun\n"
+                    f"TIP: Say {word} slowly, one sound at a time.")
+        batch = re.search(r"Now write (\d+)", prompt)
+        if batch:
+            # Lines of every length band, so each difficulty keeps enough of them
+            lines = []
+            for index in range(int(batch.group(1))):
+                for length in (4, 7, 12):
+                    start = (index * 3 + length) % len(words)
+                    picked = (words[start:] + words[:start])[:length]
+                    lines.append(f"{len(lines) + 1}. {' '.join(picked).capitalize()}.")
+            return "\n".join(lines)
+        usage = re.search(r'using the word "([^"]*)"', prompt)
+        if usage:
+            return f"I saw the word {usage.group(1)} in my {words[0]} book today."
+        return "Okay."
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            try:
+                self.respond()
+            except (BrokenPipeError, ConnectionResetError):
+                # The app gave up on the request (timeout, or the server is shutting down)
+                self.close_connection = True
+
+        def respond(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": "not found"}})
+                return
+            delay, fail, words = fake.draw()
+            prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+            text = fake.reply(prompt, words)
+            model = request.get("model", "fake")
+            created = int(time.time())
+
+            if fail:
+                time.sleep(delay)
+                self.send_json(500, {"error": {"message": "injected failure", "type": "internal_server_error"}})
+                return
+            if not request.get("stream"):
+                time.sleep(delay)
+                self.send_json(200, {
+                    "id": f"chatcmpl-{fake.requests}", "object": "chat.completion", "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": "stop", "logprobs": None}],
+                    "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split()),
+                              "total_tokens": len(prompt.split()) + len(text.split())}
+                })
+                return
+
+            # Server-sent events, one chunk per word, closing the connection at the end
+            time.sleep(delay / 2)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            tokens = re.findall(r"\S+\s*", text)
+            step = delay / 2 / max(1, len(tokens))
+            for token in tokens + [None]:
+                delta = {"content": token} if token is not None else {}
+                chunk = {"id": f"chatcmpl-{fake.requests}", "object": "chat.completion.chunk",
+                         "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": delta,
+                                      "finish_reason": None if token is not None else "stop"}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if token is not None:
+                    time.sleep(step)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+def start(port=0, latency=0.3, jitter=0.2, error_rate=0.0, seed=7):
+    """Serve on a background thread; returns (server, base_url)"""
+    fake = FakeGroq(latency, jitter, error_rate, seed)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fake))
+    server.daemon_threads = True
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- fraction of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    args = parser.parse_args()
+
+    server, base_url = start(args.port, args.latency, args.jitter, args.error_rate)
+    print(f"Fake Groq on {base_url} (latency {args.latency}s +/- {args.jitter:.0%}, errors {args.error_rate:.0%})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Load test: scripted student sessions against a real server, with Groq and TTS stubbed out.
+
+    python benchmarks/load_test.py [--server gunicorn|asgi] [--threads 1] [--concurrency 1,5,10,25]
+                                   [--sessions 2] [--llm-latency 0.3] [--json results.json]
+
+Starts benchmarks/fake_groq.py and the app (gunicorn with sync workers like
+the Procfile, gthread workers with --threads > 1, or uvicorn on asgi:app) in
+a temporary directory with TTS_BACKEND=stub and a fresh database, then for
+each concurrency level runs that many students at once. Each session:
+login -> a 5-sentence Repeat-After-Me stage -> a 5-word Spell Bee stage ->
+the meaning of one of its words -> conversation turns, alternating /process
+and the streamed /process_stream -> logout. Reports p50/p95/p99 latency
+and requests per second per route; a stream counts as an error unless it
+ends with a "done" event. Any other setting (CONTENT_MODE,
+STORAGE_WRITE_BEHIND, ...) is passed through from the environment, so the
+same script compares serving and caching modes.
+"""
+import os
+import sys
+import json
+import time
+import math
+import random
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_groq
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGE_SIZE = 5
+PASSWORD = "bench1"
+CHILD_LINES = ["i go to school by bus", "my dog name is max", "i like eat mango",
+               "yesterday i play football", "she have two brother"]
+
+# ---------- SERVER ----------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def worker_class(server, threads):
+    if server == "asgi":
+        return "uvicorn"
+    # gunicorn switches to gthread workers whenever --threads is above 1
+    return "gthread" if threads > 1 else "sync"
+
+def start_app(server, port, workers, threads, workdir, env):
+    if server == "asgi":
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port),
+                   "--workers", str(workers), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{port}",
+                   "-w", str(workers), "--threads", str(threads), "--log-level", "warning"]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited, see {log.name}")
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"Server did not start, see {log.name}")
+
+# ---------- SESSIONS ----------
+class Recorder:
+    """Latency samples per route"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)  # Format: {route: [seconds]}
+        self.errors = defaultdict(int)
+
+    def call(self, client, method, route, **kwargs):
+        started = time.perf_counter()
+        try:
+            # Not streamed by the client, so a /process_stream sample covers the whole stream
+            response = client.request(method, route, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        elapsed = time.perf_counter() - started
+        content_type = response.headers.get("content-type", "") if ok else ""
+        if content_type.startswith("application/x-ndjson"):
+            events = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+            ok = bool(events) and events[-1].get("type") == "done"
+        with self.lock:
+            self.samples[route].append(elapsed)
+            if not ok:
+                self.errors[route] += 1
+        if ok and content_type.startswith("application/json"):
+            return response.json()
+        return {}
+
+def misspell(word, rng):
+    if len(word) < 3 or rng.random() < 0.5:
+        return word
+    index = rng.randrange(len(word))
+    return word[:index] + word[index + 1:]
+
+def mispronounce(sentence, rng):
+    words = sentence.split()
+    if len(words) > 2 and rng.random() < 0.5:
+        del words[rng.randrange(len(words))]
+    return " ".join(words)
+
+def run_session(base_url, user_id, recorder, turns, rng):
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        recorder.call(client, "POST", "/login", json={"user_id": user_id, "password": PASSWORD,
+                                                      "user_type": "student"})
+        for index in range(STAGE_SIZE):
+            item = recorder.call(client, "POST", "/repeat_sentence", json={"category": "general",
+                                                                            "difficulty": "easy"})
+            sentence = item.get("sentence", "The cat sat on the mat")
+            recorder.call(client, "POST", "/check_repeat", json={
+                "student": mispronounce(sentence, rng), "correct": sentence,
+                "stage_complete": index == STAGE_SIZE - 1})
+        words = []
+        for index in range(STAGE_SIZE):
+            item = recorder.call(client, "POST", "/spell_word", json={"difficulty": "easy"})
+            words.append(item.get("word", "cat"))
+            recorder.call(client, "POST", "/check_spelling", json={
+                "spelling": misspell(words[-1], rng), "correct": words[-1],
+                "stage_complete": index == STAGE_SIZE - 1})
+        recorder.call(client, "POST", "/get_meaning", json={"word": rng.choice(words)})
+        for turn in range(turns):
+            route = "/process_stream" if turn % 2 else "/process"
+            recorder.call(client, "POST", route, json={"text": rng.choice(CHILD_LINES)})
+        recorder.call(client, "GET", "/logout")
+
+def create_students(base_url, count):
+    user_ids = [str(100 + index) for index in range(count)]
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        for user_id in user_ids:
+            client.post("/signup", json={"user_type": "student", "user_id": user_id, "password": PASSWORD,
+                                         "name": f"Student {user_id}", "class": "5", "division": "A"})
+    return user_ids
+
+def run_level(base_url, user_ids, concurrency, sessions, turns, seed):
+    """Run `concurrency` students at once, each doing `sessions` sessions back to back"""
+    recorder = Recorder()
+
+    def student(slot):
+        rng = random.Random(seed * 1000 + slot)
+        for _ in range(sessions):
+            run_session(base_url, user_ids[slot], recorder, turns, rng)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=student, args=(slot,)) for slot in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return recorder, time.perf_counter() - started
+
+# ---------- REPORT ----------
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+def summarize(recorder, wall):
+    routes = {}
+    everything = []
+    for route, samples in sorted(recorder.samples.items()):
+        samples = sorted(samples)
+        everything.extend(samples)
+        routes[route] = {'count': len(samples), 'errors': recorder.errors[route],
+                         'p50': percentile(samples, 0.50), 'p95': percentile(samples, 0.95),
+                         'p99': percentile(samples, 0.99), 'rps': len(samples) / wall}
+    everything.sort()
+    routes['ALL'] = {'count': len(everything), 'errors': sum(recorder.errors.values()),
+                     'p50': percentile(everything, 0.50), 'p95': percentile(everything, 0.95),
+                     'p99': percentile(everything, 0.99), 'rps': len(everything) / wall}
+    return routes
+
+def print_level(concurrency, wall, routes):
+    print(f"\n== concurrency {concurrency}: {routes['ALL']['count']} requests in {wall:.1f}s ==")
+    print(f"{'route':<18}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'rps':>8}")
+    for route, row in routes.items():
+        print(f"{route:<18}{row['count']:>7}{row['errors']:>8}{row['p50'] * 1000:>9.1f}"
+              f"{row['p95'] * 1000:>9.1f}{row['p99'] * 1000:>9.1f}{row['rps']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=["gunicorn", "asgi"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=1,
+                        help="gunicorn threads per worker (1 = sync workers, as in the Procfile)")
+    parser.add_argument("--concurrency", default="1,5,10,25", help="comma-separated student counts")
+    parser.add_argument("--sessions", type=int, default=2, help="sessions per student per level")
+    parser.add_argument("--turns", type=int, default=3, help="conversation turns per session")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary directory")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    if max(levels) > 900:
+        parser.error("at most 900 students (user IDs are 3 digits)")
+    workdir = tempfile.mkdtemp(prefix="smartspeak-bench-")
+    groq_server, groq_url = fake_groq.start(0, args.llm_latency, args.llm_jitter, args.llm_error_rate, args.seed)
+    env = dict(os.environ,
+               GROQ_API_KEY="fake", GROQ_BASE_URL=groq_url, TTS_BACKEND="stub",
+               DATABASE_PATH=os.path.join(workdir, "bench.db"),
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO, os.environ.get("PYTHONPATH")])))
+    process, base_url = start_app(args.server, free_port(), args.workers, args.threads, workdir, env)
+
+    results = {'server': args.server, 'worker_class': worker_class(args.server, args.threads),
+               'workers': args.workers, 'threads': args.threads, 'llm_latency': args.llm_latency, 'levels': []}
+    try:
+        user_ids = create_students(base_url, max(levels))
+        threads = f" x {args.threads} threads" if args.server == "gunicorn" and args.threads > 1 else ""
+        print(f"{args.server}, {args.workers} {results['worker_class']} workers{threads}, "
+              f"fake Groq {args.llm_latency}s, TTS stub")
+        for concurrency in levels:
+            recorder, wall = run_level(base_url, user_ids, concurrency, args.sessions, args.turns, args.seed)
+            routes = summarize(recorder, wall)
+            print_level(concurrency, wall, routes)
+            results['levels'].append({'concurrency': concurrency, 'seconds': wall, 'routes': routes})
+        results['llm_requests'] = groq_server.fake.requests
+        print(f"\nFake Groq served {groq_server.fake.requests} requests")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        groq_server.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
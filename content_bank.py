@@ -0,0 +1,167 @@
+import os
+import json
+import random
+import threading
+from collections import OrderedDict, defaultdict, deque
+
+# ================= CONTENT BANK =================
+# Curated practice sentences and spelling words, loaded once from
+# CONTENT_BANK_PATH (content_bank.json):
+#   {"categories": {name: {"description": str, "sentences": {difficulty: [str]}}},
+#    "words": {difficulty: [str]}}
+# The LLM is optional enrichment on top of the bank. CONTENT_MODE picks how
+# often it is asked for fresh items:
+#   mixed - LLM_FRESH_RATIO of requests go to the LLM, the rest are served from the bank (default)
+#   bank  - never call the LLM for sentences or words
+#   llm   - always ask the LLM first (the bank only fills gaps)
+# In mixed mode the LLM is also asked whenever the bank has fewer unseen
+# sentences left for a child than a stage needs. In mixed and llm mode
+# everything is served from the bank while the LLM gateway's circuit
+# breaker is open.
+#
+# Bank sentences outside WORD_LIMITS for their difficulty, and duplicates,
+# are skipped at load time.
+CONTENT_MODE = os.getenv("CONTENT_MODE", "mixed")
+LLM_FRESH_RATIO = float(os.getenv("LLM_FRESH_RATIO", "0.25"))
+
+# Word count range per difficulty, used in prompts and to validate bank and generated sentences
+WORD_LIMITS = {
+    "easy": (3, 5),
+    "medium": (6, 9),
+    "hard": (10, 15)
+}
+
+class ContentBank:
+    """Indexed sentences and words with per-user no-repeat sampling.
+
+    Each (user, bucket) gets a shuffled deck; items are dealt until the deck
+    runs out, then it is reshuffled, so a child sees every item once before
+    any repeats. Decks of the least recently seen users beyond `max_decks`
+    are dropped.
+    """
+
+    def __init__(self, data, llm=None, mode=CONTENT_MODE, fresh_ratio=LLM_FRESH_RATIO, max_decks=20000):
+        self.llm = llm
+        self.mode = mode
+        self.fresh_ratio = fresh_ratio
+        self.max_decks = max_decks
+        self.descriptions = {}
+        self.by_difficulty = {}                          # Format: {(category, difficulty): [sentence]}
+        self.by_length = defaultdict(lambda: defaultdict(list))  # Format: {category: {word_count: [sentence]}}
+        self.words = {}                                  # Format: {difficulty: [word]}
+
+        for category, info in data["categories"].items():
+            self.descriptions[category] = info["description"]
+            for difficulty, sentences in info["sentences"].items():
+                low, high = WORD_LIMITS.get(difficulty, (1, None))
+                kept, seen = [], set()
+                for sentence in sentences:
+                    count = len(sentence.split())
+                    if count < low or (high is not None and count > high):
+                        print(f"Skipping content bank sentence ({category}/{difficulty}, {count} words): {sentence}")
+                        continue
+                    if sentence.lower() in seen:
+                        print(f"Skipping duplicate content bank sentence ({category}/{difficulty}): {sentence}")
+                        continue
+                    seen.add(sentence.lower())
+                    kept.append(sentence)
+                    self.by_length[category][count].append(sentence)
+                self.by_difficulty[(category, difficulty)] = kept
+        for difficulty, words in data["words"].items():
+            self.words[difficulty] = [word.lower() for word in words]
+
+        self.lock = threading.Lock()
+        self.decks = OrderedDict()  # Format: {(user_id, bucket): deque()}
+
+    # ---------- LOOKUPS ----------
+    def description(self, category):
+        return self.descriptions.get(category, self.descriptions["general"])
+
+    def sentences(self, category, difficulty):
+        """Curated sentences for a category and difficulty (general/easy if unknown)"""
+        return (self.by_difficulty.get((category, difficulty))
+                or self.by_difficulty.get((category, "easy"))
+                or self.by_difficulty[("general", "easy")])
+
+    def sentences_between(self, category, low, high):
+        """Curated sentences in a category with low..high words"""
+        lengths = self.by_length.get(category, {})
+        return [sentence for count in range(low, high + 1) for sentence in lengths.get(count, [])]
+
+    def word_list(self, difficulty):
+        return self.words.get(difficulty) or self.words["easy"]
+
+    def all_sentences(self):
+        for sentences in self.by_difficulty.values():
+            yield from sentences
+
+    def all_words(self):
+        for words in self.words.values():
+            yield from words
+
+    # ---------- NO-REPEAT SAMPLING ----------
+    def _deal(self, user_id, bucket, items, count, avoid=()):
+        skip = {item.lower() for item in avoid}
+        dealt = []
+        key = (user_id, bucket)
+        with self.lock:
+            deck = self.decks.pop(key, None) or deque()
+            self.decks[key] = deck
+            # At most one full pass through a fresh deck, so avoid can't loop forever
+            for _ in range(len(deck) + len(items)):
+                if len(dealt) >= count:
+                    break
+                if not deck:
+                    deck.extend(random.sample(items, len(items)))
+                item = deck.popleft()
+                if item.lower() not in skip:
+                    skip.add(item.lower())
+                    dealt.append(item)
+            while len(self.decks) > self.max_decks:
+                self.decks.popitem(last=False)
+        return dealt
+
+    def sample_sentences(self, user_id, category, difficulty, count=1, avoid=()):
+        """Up to count sentences this user has not had recently"""
+        return self._deal(user_id, ("sentence", category, difficulty),
+                          self.sentences(category, difficulty), count, avoid)
+
+    def unseen_sentences(self, user_id, category, difficulty, avoid=()):
+        """How many sentences can still be dealt to this user before their deck repeats"""
+        skip = {item.lower() for item in avoid}
+        with self.lock:
+            deck = self.decks.get((user_id, ("sentence", category, difficulty)))
+            remaining = list(deck) if deck is not None else self.sentences(category, difficulty)
+        return sum(1 for sentence in remaining if sentence.lower() not in skip)
+
+    def sample_word(self, user_id, difficulty):
+        return self._deal(user_id, ("word", difficulty), self.word_list(difficulty), 1)[0]
+
+    def forget_user(self, user_id):
+        with self.lock:
+            for key in [k for k in self.decks if k[0] == user_id]:
+                del self.decks[key]
+
+    # ---------- LLM ENRICHMENT ----------
+    def llm_available(self):
+        """False in bank mode or while the LLM's circuit breaker is open"""
+        return self.mode != "bank" and (self.llm is None or self.llm.available())
+
+    def wants_fresh(self):
+        """Whether this request should ask the LLM for fresh content"""
+        if not self.llm_available():
+            return False
+        return self.mode == "llm" or random.random() < self.fresh_ratio
+
+    def stats(self):
+        with self.lock:
+            decks = len(self.decks)
+        return {'mode': self.mode, 'fresh_ratio': self.fresh_ratio, 'decks': decks,
+                'bank_only': not self.llm_available()}
+
+def load_content_bank(path=None, llm=None):
+    """Load the bank from CONTENT_BANK_PATH"""
+    path = path or os.getenv("CONTENT_BANK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               "content_bank.json"))
+    with open(path, "r", encoding="utf-8") as f:
+        return ContentBank(json.load(f), llm)
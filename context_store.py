@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from storage import connect_sqlite
+
+# ================= CONVERSATION CONTEXT STORE =================
+# Holds each user's per-mode conversation memory ('conversation', 'roleplay').
+# Entries expire after CONTEXT_TTL seconds without use, and the least recently
+# used users are dropped once the store is over its limits.
+# CONTEXT_BACKEND picks where contexts live:
+#   memory - in this process only (each gunicorn worker has its own)
+#   sqlite - a table in a local database file, shared by all workers (default)
+#   redis  - any Redis-compatible server at REDIS_URL (Redis, Valkey, KeyDB...)
+# Values are any JSON-serializable object.
+CONTEXT_TTL = int(os.getenv("CONTEXT_TTL", str(2 * 60 * 60)))
+CONTEXT_MAX_USERS = int(os.getenv("CONTEXT_MAX_USERS", "5000"))
+CONTEXT_MAX_BYTES = int(os.getenv("CONTEXT_MAX_MB", "32")) * 1024 * 1024
+
+class ContextStore:
+    """Interface for per-user, per-mode conversation memory"""
+
+    def get(self, user_id, mode, default=None):
+        raise NotImplementedError
+
+    def set(self, user_id, mode, value):
+        raise NotImplementedError
+
+    def clear(self, user_id):
+        """Forget every mode for a user (logout)"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+# ---------- IN-PROCESS ----------
+class MemoryContextStore(ContextStore):
+    """LRU dict with TTL and a byte cap"""
+
+    def __init__(self, ttl=CONTEXT_TTL, max_users=CONTEXT_MAX_USERS, max_bytes=CONTEXT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # Format: {user_id: {'modes': {mode: json}, 'expires': t, 'size': n}}
+        self.size = 0
+
+    def _drop(self, user_id):
+        self.size -= self.entries.pop(user_id)['size']
+
+    def get(self, user_id, mode, default=None):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return default
+            if entry['expires'] < time.time():
+                self._drop(user_id)
+                return default
+            entry['expires'] = time.time() + self.ttl
+            self.entries.move_to_end(user_id)
+            raw = entry['modes'].get(mode)
+        return json.loads(raw) if raw is not None else default
+
+    def set(self, user_id, mode, value):
+        raw = json.dumps(value)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                entry = self.entries[user_id] = {'modes': {}, 'expires': 0, 'size': 0}
+            old_size = len(entry['modes'].get(mode, ""))
+            entry['modes'][mode] = raw
+            entry['size'] += len(raw) - old_size
+            entry['expires'] = time.time() + self.ttl
+            self.size += len(raw) - old_size
+            self.entries.move_to_end(user_id)
+            self._evict()
+
+    def _evict(self):
+        # The TTL slides on every use, so the oldest entries expire first
+        now = time.time()
+        while self.entries:
+            user_id, entry = next(iter(self.entries.items()))
+            if entry['expires'] >= now and len(self.entries) <= self.max_users and self.size <= self.max_bytes:
+                break
+            self._drop(user_id)
+
+    def clear(self, user_id):
+        with self.lock:
+            if user_id in self.entries:
+                self._drop(user_id)
+
+    def stats(self):
+        with self.lock:
+            return {'users': len(self.entries), 'bytes': self.size}
+
+# ---------- SQLITE ----------
+class SQLiteContextStore(ContextStore):
+    """Contexts in a SQLite table, shared by every worker on the machine"""
+
+    PRUNE_EVERY = 100  # Writes between TTL/LRU clean-ups
+    TOUCH_EVERY = 60   # Seconds a read leaves used_at alone, so most reads don't write
+
+    def __init__(self, path, ttl=CONTEXT_TTL, max_users=CONTEXT_MAX_USERS, max_bytes=CONTEXT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        self.writes = 0
+        self.connect().executescript("""
+            CREATE TABLE IF NOT EXISTS contexts (
+                user_id TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                value TEXT NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (user_id, mode)
+            );
+            CREATE INDEX IF NOT EXISTS idx_contexts_used_at ON contexts (used_at);
+        """)
+
+    def connect(self):
+        return connect_sqlite(self.local, self.path)
+
+    def get(self, user_id, mode, default=None):
+        conn = self.connect()
+        row = conn.execute("SELECT value, used_at FROM contexts WHERE user_id = ? AND mode = ?",
+                           (user_id, mode)).fetchone()
+        now = time.time()
+        if row is None or row[1] < now - self.ttl:
+            return default
+        if row[1] < now - self.TOUCH_EVERY:
+            conn.execute("UPDATE contexts SET used_at = ? WHERE user_id = ?", (now, user_id))
+        return json.loads(row[0])
+
+    def set(self, user_id, mode, value):
+        conn = self.connect()
+        conn.execute("INSERT OR REPLACE INTO contexts (user_id, mode, value, used_at) VALUES (?, ?, ?, ?)",
+                     (user_id, mode, json.dumps(value), time.time()))
+        self.writes += 1
+        if self.writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """Delete expired contexts and the least recently used users over the limits"""
+        conn = self.connect()
+        conn.execute("DELETE FROM contexts WHERE used_at < ?", (time.time() - self.ttl,))
+        users = conn.execute("SELECT user_id, SUM(LENGTH(value)) FROM contexts GROUP BY user_id "
+                             "ORDER BY MAX(used_at) DESC").fetchall()
+        total = 0
+        stale = []
+        for index, (user_id, size) in enumerate(users):
+            total += size
+            if index >= self.max_users or total > self.max_bytes:
+                stale.append((user_id,))
+        if stale:
+            conn.executemany("DELETE FROM contexts WHERE user_id = ?", stale)
+
+    def clear(self, user_id):
+        self.connect().execute("DELETE FROM contexts WHERE user_id = ?", (user_id,))
+
+    def stats(self):
+        row = self.connect().execute(
+            "SELECT COUNT(DISTINCT user_id), COALESCE(SUM(LENGTH(value)), 0) FROM contexts").fetchone()
+        return {'users': row[0], 'bytes': row[1]}
+
+# ---------- REDIS ----------
+class RedisContextStore(ContextStore):
+    """One hash per user with a sliding TTL; eviction follows the server's maxmemory policy"""
+
+    def __init__(self, url, ttl=CONTEXT_TTL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CONTEXT_BACKEND=redis needs the 'redis' package.")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def _key(self, user_id):
+        return f"smartspeak:context:{user_id}"
+
+    def get(self, user_id, mode, default=None):
+        key = self._key(user_id)
+        raw = self.client.hget(key, mode)
+        if raw is None:
+            return default
+        self.client.expire(key, self.ttl)
+        return json.loads(raw)
+
+    def set(self, user_id, mode, value):
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, mode, json.dumps(value))
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def clear(self, user_id):
+        self.client.delete(self._key(user_id))
+
+def create_context_store():
+    """Build the store selected by CONTEXT_BACKEND"""
+    backend = os.getenv("CONTEXT_BACKEND", "sqlite")
+    if backend == "memory":
+        return MemoryContextStore()
+    if backend == "redis":
+        return RedisContextStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    if backend != "sqlite":
+        print(f"Unknown CONTEXT_BACKEND '{backend}', using sqlite")
+    return SQLiteContextStore(os.getenv("CONTEXT_DB_PATH", os.getenv("DATABASE_PATH", "smartspeak.db")))
@@ -0,0 +1,74 @@
+import os
+
+# ================= CONTEXT WINDOW =================
+# A conversation context is a small record:
+#   {'turns': [{'speaker', 'child', 'reply', 'topic', 'tokens'}], 'summary': '', 'text': ''}
+# Only the last CONTEXT_MAX_TURNS whole turns that fit in CONTEXT_TOKEN_BUDGET
+# are kept. Older turns are folded into a short rolling summary of the
+# questions already asked, so the coach keeps asking about new topics.
+# 'text' is the rendered prompt section, built once per turn instead of on
+# every request.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "300"))
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "6"))
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "60"))
+SUMMARY_SEPARATOR = " | "
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English)"""
+    return (len(text) + 3) // 4
+
+def empty_context():
+    return {'turns': [], 'summary': '', 'text': ''}
+
+def as_context(value):
+    """Coerce whatever the context store returned into a context record"""
+    if isinstance(value, dict) and 'turns' in value:
+        return value
+    return empty_context()
+
+def add_turn(context, speaker, child_text, reply, topic=""):
+    """Return a new context with one more exchange, trimmed to the token budget"""
+    turn_text = f"{speaker}: {child_text}\nAssistant: {reply}"
+    turns = context['turns'] + [{
+        'speaker': speaker,
+        'child': child_text,
+        'reply': reply,
+        'topic': topic,
+        'tokens': estimate_tokens(turn_text)
+    }]
+
+    total = sum(turn['tokens'] for turn in turns)
+    dropped = []
+    # Whole turns only; the newest turn is always kept
+    while len(turns) > 1 and (len(turns) > CONTEXT_MAX_TURNS or total > CONTEXT_TOKEN_BUDGET):
+        oldest = turns.pop(0)
+        total -= oldest['tokens']
+        dropped.append(oldest)
+
+    summary = fold_summary(context['summary'], dropped) if dropped else context['summary']
+    return {'turns': turns, 'summary': summary, 'text': render(turns, summary)}
+
+def fold_summary(summary, dropped_turns):
+    """Add the topics of dropped turns to the summary, keeping the newest that fit"""
+    topics = summary.split(SUMMARY_SEPARATOR) if summary else []
+    topics += [turn['topic'] for turn in dropped_turns if turn.get('topic')]
+
+    kept = []
+    tokens = 0
+    for topic in reversed(topics):
+        cost = estimate_tokens(topic + SUMMARY_SEPARATOR)
+        if tokens + cost > CONTEXT_SUMMARY_TOKENS:
+            break
+        kept.append(topic)
+        tokens += cost
+    return SUMMARY_SEPARATOR.join(reversed(kept))
+
+def render(turns, summary):
+    """Prompt text for the kept turns"""
+    lines = []
+    if summary:
+        lines.append(f"(Earlier questions already asked: {summary})")
+    for turn in turns:
+        lines.append(f"{turn['speaker']}: {turn['child']}")
+        lines.append(f"Assistant: {turn['reply']}")
+    return "\n".join(lines)
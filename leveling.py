@@ -0,0 +1,50 @@
+import os
+from bisect import bisect_right
+
+# ================= LEVELING =================
+# XP_CURVE lists the XP each level-up costs, starting with level 1 -> 2.
+# The last step repeats for every level after the list, so the default
+# "25,30" means 25 XP for level 2, then 30 XP for each level after that.
+# The cumulative XP of the listed levels is precomputed once: a level is a
+# bisect into that table, and past the table it is plain arithmetic.
+XP_CURVE = [int(step) for step in os.getenv("XP_CURVE", "25,30").split(",") if step.strip()]
+
+# XP_TABLE[i]: total XP required to reach level i + 1
+XP_TABLE = [0]
+for _step in XP_CURVE:
+    XP_TABLE.append(XP_TABLE[-1] + _step)
+LAST_STEP = XP_CURVE[-1]
+
+def xp_for_level(level):
+    """Total XP required to reach a level"""
+    if level <= 1:
+        return 0
+    if level <= len(XP_TABLE):
+        return XP_TABLE[level - 1]
+    return XP_TABLE[-1] + (level - len(XP_TABLE)) * LAST_STEP
+
+def xp_for_next_level(level):
+    """XP needed to go from level to level + 1"""
+    return xp_for_level(level + 1) - xp_for_level(level)
+
+def level_for_xp(xp):
+    """Level reached with a total of xp"""
+    if xp < XP_TABLE[-1]:
+        return max(1, bisect_right(XP_TABLE, xp))
+    return len(XP_TABLE) + (xp - XP_TABLE[-1]) // LAST_STEP
+
+def level_progress(level, xp):
+    """Progress bar numbers for a stored level and total XP"""
+    return {
+        'xp_in_current_level': xp - xp_for_level(level),
+        'xp_needed_for_next': xp_for_next_level(level)
+    }
+
+def difficulty_for_level(level):
+    """Auto-adjust difficulty based on level"""
+    if level <= 4:
+        return "easy"
+    elif level <= 10:
+        return "medium"
+    else:
+        return "hard"
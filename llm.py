@@ -0,0 +1,298 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import groq
+import metrics
+
+# ================= LLM GATEWAY =================
+# Every Groq call goes through one LLMGateway:
+#   - each attempt has a timeout (LLM_TIMEOUT) and the whole call a deadline (LLM_DEADLINE)
+#   - connection errors, timeouts, rate limits and 5xx are retried up to
+#     LLM_RETRIES times with full-jitter exponential backoff (LLM_BACKOFF base)
+#   - a circuit breaker opens after LLM_BREAKER_FAILURES failed calls in a
+#     row, or calls whose successful attempt took longer than LLM_SLOW_SECONDS;
+#     while it is open calls fail fast with LLMUnavailable and callers serve
+#     bank or canned content instead. After LLM_BREAKER_RESET seconds one
+#     trial call is let through. Non-retryable 4xx answers (a bad request is
+#     the caller's bug, not an outage) do not count against it.
+#   - identical prompts already in flight are single-flighted: concurrent
+#     callers wait for the one request and share its answer
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "10"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "20"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.25"))
+LLM_SLOW_SECONDS = float(os.getenv("LLM_SLOW_SECONDS", "4"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+RETRYABLE_ERRORS = (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)  # Includes timeouts
+
+def is_client_error(error):
+    """A non-retryable 4xx answer: the request was wrong, the LLM itself is fine"""
+    return (isinstance(error, groq.APIStatusError) and not isinstance(error, groq.RateLimitError)
+            and 400 <= error.status_code < 500)
+
+class LLMUnavailable(Exception):
+    """The LLM could not answer: the breaker is open or every attempt failed"""
+
+# ---------- CIRCUIT BREAKER ----------
+class CircuitBreaker:
+    """closed -> open after `failures` in a row -> half-open after `reset` seconds"""
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, reset=LLM_BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self.lock = threading.Lock()
+        self.failed = 0
+        self.opened_at = None
+        self.trial = False
+        self.opens = 0
+
+    def state(self):
+        with self.lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.time() - self.opened_at >= self.reset else "open"
+
+    def available(self):
+        """Whether a call would currently be let through (does not claim the trial)"""
+        with self.lock:
+            state = self._state()
+            return state == "closed" or (state == "half-open" and not self.trial)
+
+    def allow(self):
+        """Claim permission for one call"""
+        with self.lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial:
+                self.trial = True
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failed = 0
+            self.opened_at = None
+            self.trial = False
+
+    def release(self):
+        """End a call that says nothing about the LLM's health (frees the half-open trial)"""
+        with self.lock:
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failed += 1
+            self.trial = False
+            if self.opened_at is not None or self.failed >= self.failures:
+                if self.opened_at is None:
+                    self.opens += 1
+                self.opened_at = time.time()
+
+# ---------- GATEWAY ----------
+class LLMGateway:
+    """Deadlines, retries, circuit breaking and single-flight around a Groq client"""
+
+    def __init__(self, client, model=LLM_MODEL, timeout=LLM_TIMEOUT, deadline=LLM_DEADLINE,
+                 retries=LLM_RETRIES, backoff=LLM_BACKOFF, breaker=None):
+        self.client = client
+        self.async_client = None
+        self.model = model
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.lock = threading.Lock()  # Guards inflight and the counters below
+        self.inflight = {}        # Format: {key: {'done': Event, 'result': str, 'error': exc}}
+        self.async_inflight = {}  # Format: {key: asyncio.Future}, used on the event loop only
+        self.calls = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.rejected = 0
+
+    def use_async_client(self, async_client):
+        """Enable acomplete() with an AsyncGroq client"""
+        self.async_client = async_client
+
+    def available(self):
+        """False while the circuit breaker is open"""
+        return self.breaker.available()
+
+    def _messages(self, prompt):
+        return [{"role": "user", "content": prompt}]
+
+    def _key(self, prompt, options):
+        return prompt, tuple(sorted(options.items()))
+
+    def _pause(self, attempt, deadline_at):
+        """Full-jitter backoff delay, or None if it would run past the deadline"""
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if time.time() + delay >= deadline_at:
+            return None
+        return delay
+
+    def _count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _record(self, attempt_started):
+        """Feed the breaker the duration of the attempt that succeeded (not retries and backoff)"""
+        if time.time() - attempt_started > LLM_SLOW_SECONDS:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+
+    def _failed(self, error):
+        if is_client_error(error):
+            self.breaker.release()
+        else:
+            self.breaker.failure()
+
+    def _attempts(self):
+        """Yield (attempt, timeout, deadline_at) until retries or the deadline run out"""
+        deadline_at = time.time() + self.deadline
+        for attempt in range(self.retries + 1):
+            remaining = deadline_at - time.time()
+            if remaining <= 0:
+                return
+            if attempt:
+                self._count("retried")
+            yield attempt, min(self.timeout, remaining), deadline_at
+
+    def _create(self, prompt, **options):
+        """One call with retries, for the current thread; returns the raw response"""
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise LLMUnavailable("circuit breaker is open")
+        self._count("calls")
+        started = time.time()
+        kind = "stream" if options.get("stream") else "complete"
+        error = None
+        for attempt, timeout, deadline_at in self._attempts():
+            attempt_started = time.time()
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model, messages=self._messages(prompt), timeout=timeout, **options)
+                self._record(attempt_started)
+                metrics.observe("llm_call_seconds", time.time() - started, kind=kind, outcome="ok")
+                return response
+            except RETRYABLE_ERRORS as e:
+                error = e
+                delay = self._pause(attempt, deadline_at)
+                if delay is None or attempt == self.retries:
+                    break
+                time.sleep(delay)
+            except Exception as e:
+                error = e
+                break
+        self._failed(error)
+        metrics.observe("llm_call_seconds", time.time() - started, kind=kind, outcome="error")
+        raise LLMUnavailable(str(error or "deadline exceeded")) from error
+
+    def complete(self, prompt, **options):
+        """Text of one completion; identical concurrent prompts share a single request"""
+        key = self._key(prompt, options)
+        with self.lock:
+            flight = self.inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.inflight[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight['done'].wait(self.deadline + self.timeout)
+            if flight['error'] is not None:
+                raise flight['error']
+            if flight['result'] is None:
+                raise LLMUnavailable("shared request did not finish")
+            return flight['result']
+
+        try:
+            response = self._create(prompt, **options)
+            flight['result'] = response.choices[0].message.content.strip()
+            return flight['result']
+        except Exception as e:
+            flight['error'] = e if isinstance(e, LLMUnavailable) else LLMUnavailable(str(e))
+            raise flight['error'] from e
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            flight['done'].set()
+
+    def stream(self, prompt, **options):
+        """Yield text chunks as they arrive; only opening the stream is retried"""
+        response = self._create(prompt, stream=True, **options)
+        try:
+            for chunk in response:
+                text = chunk.choices[0].delta.content or ""
+                if text:
+                    yield text
+        except Exception as e:
+            self.breaker.failure()
+            raise LLMUnavailable(str(e)) from e
+
+    async def _acreate(self, prompt, **options):
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise LLMUnavailable("circuit breaker is open")
+        self._count("calls")
+        started = time.time()
+        error = None
+        for attempt, timeout, deadline_at in self._attempts():
+            attempt_started = time.time()
+            try:
+                response = await asyncio.wait_for(self.async_client.chat.completions.create(
+                    model=self.model, messages=self._messages(prompt), timeout=timeout, **options), timeout)
+                self._record(attempt_started)
+                metrics.observe("llm_call_seconds", time.time() - started, kind="async", outcome="ok")
+                return response
+            except RETRYABLE_ERRORS + (asyncio.TimeoutError,) as e:
+                error = e
+                delay = self._pause(attempt, deadline_at)
+                if delay is None or attempt == self.retries:
+                    break
+                await asyncio.sleep(delay)
+            except Exception as e:
+                error = e
+                break
+        self._failed(error)
+        metrics.observe("llm_call_seconds", time.time() - started, kind="async", outcome="error")
+        raise LLMUnavailable(str(error or "deadline exceeded")) from error
+
+    async def acomplete(self, prompt, **options):
+        """Async complete() for the ASGI app; single-flighted per event loop"""
+        key = self._key(prompt, options)
+        future = self.async_inflight.get(key)
+        if future is not None:
+            self._count("coalesced")
+            return await asyncio.shield(future)
+
+        future = self.async_inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await self._acreate(prompt, **options)
+            future.set_result(response.choices[0].message.content.strip())
+        except Exception as e:
+            future.set_exception(e if isinstance(e, LLMUnavailable) else LLMUnavailable(str(e)))
+        finally:
+            self.async_inflight.pop(key, None)
+            if not future.done():
+                # The leader was cancelled (its client went away): release the followers
+                future.set_exception(LLMUnavailable("shared request was cancelled"))
+                future.exception()  # Retrieved here, so an unawaited future is not logged
+        return future.result()
+
+    def stats(self):
+        with self.lock:
+            counts = {'calls': self.calls, 'retried': self.retried, 'coalesced': self.coalesced,
+                      'rejected': self.rejected}
+        return dict(counts, state=self.breaker.state(), breaker_opens=self.breaker.opens)
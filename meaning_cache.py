@@ -0,0 +1,74 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from storage import connect_sqlite
+
+# ================= WORD MEANING CACHE =================
+# Parsed /get_meaning answers (meaning, usage, type, tip) and their audio URL,
+# keyed on the normalized word and kept in a SQLite table shared by every
+# worker. Entries expire after MEANING_CACHE_TTL seconds. Each entry carries
+# the cache version (a hash of the prompt and model, plus MEANING_CACHE_VERSION),
+# so changing the prompt makes every old answer a miss. `flask purge-meanings`
+# deletes both kinds of stale entry.
+MEANING_CACHE_TTL = int(os.getenv("MEANING_CACHE_TTL", str(30 * 24 * 60 * 60)))
+
+def normalize_word(word):
+    """Lowercase, trimmed word without surrounding punctuation"""
+    return re.sub(r"^[^\w']+|[^\w']+$", "", word.strip().lower())
+
+def cache_version(*parts):
+    """Short hash of whatever shapes the answer (prompt template, model, manual bump)"""
+    parts = parts + (os.getenv("MEANING_CACHE_VERSION", "1"),)
+    return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()[:12]
+
+class MeaningCache:
+    """Word meanings in a SQLite table"""
+
+    def __init__(self, path, version, ttl=MEANING_CACHE_TTL):
+        self.path = path
+        self.version = version
+        self.ttl = ttl
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.connect().executescript("""
+            CREATE TABLE IF NOT EXISTS meanings (
+                word TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                audio TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+
+    def connect(self):
+        return connect_sqlite(self.local, self.path)
+
+    def get(self, word):
+        """(fields, audio) for a current entry, or None"""
+        row = self.connect().execute("SELECT version, fields, audio, created_at FROM meanings WHERE word = ?",
+                                     (normalize_word(word),)).fetchone()
+        if row is None or row[0] != self.version or row[3] < time.time() - self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[1]), row[2]
+
+    def put(self, word, fields, audio):
+        self.connect().execute(
+            "INSERT OR REPLACE INTO meanings (word, version, fields, audio, created_at) VALUES (?, ?, ?, ?, ?)",
+            (normalize_word(word), self.version, json.dumps(fields), audio, time.time()))
+
+    def purge(self):
+        """Delete expired entries and entries from older versions; returns the number removed"""
+        cursor = self.connect().execute("DELETE FROM meanings WHERE version != ? OR created_at < ?",
+                                        (self.version, time.time() - self.ttl))
+        return cursor.rowcount
+
+    def stats(self):
+        row = self.connect().execute("SELECT COUNT(*) FROM meanings WHERE version = ?",
+                                     (self.version,)).fetchone()
+        return {'entries': row[0], 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,140 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# ================= METRICS =================
+# Latency histograms and counters for the hot paths (routes, LLM calls, TTS,
+# database writes), rendered in the Prometheus text format at /metrics.
+# Cache hit/miss counts and other numbers that components already keep in
+# their stats() are read through collectors at scrape time, so they cost
+# nothing per request.
+#
+# METRICS_ENABLED=0 turns every observe()/inc()/timed() into a no-op and
+# disables /metrics. Metrics are per process: with several gunicorn or
+# uvicorn workers, each scrape sees the worker that answered it.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Seconds; wide enough for TTS synthesis and slow LLM calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'http_request_seconds': "Time spent handling a request, by endpoint, method and status",
+    'llm_call_seconds': "Time of one LLM gateway call including retries, by kind and outcome",
+    'tts_synthesize_seconds': "Time to synthesize one audio file on a cache miss, by backend",
+    'tts_requests_total': "speak_to_file calls, by result (hit or synthesized)",
+    'store_write_seconds': "Time of one student database write, by operation",
+    'cache_hits_total': "Cache hits, by cache",
+    'cache_misses_total': "Cache misses, by cache",
+    'cache_hit_ratio': "Hits / (hits + misses) since the process started, by cache",
+}
+
+_lock = threading.Lock()
+_histograms = {}  # Format: {name: {labels: [bucket counts..., +Inf count, sum]}}
+_counters = {}    # Format: {name: {labels: value}}
+_collectors = []  # Callables returning [(name, type, labels dict, value)]
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+def observe(name, seconds, **labels):
+    """Add one duration to a histogram"""
+    if not METRICS_ENABLED:
+        return
+    index = bisect_left(BUCKETS, seconds)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        values = series.get(_key(labels))
+        if values is None:
+            values = series[_key(labels)] = [0] * (len(BUCKETS) + 1) + [0.0]
+        values[index] += 1
+        values[-1] += seconds
+
+def inc(name, amount=1, **labels):
+    """Add to a counter"""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[_key(labels)] = series.get(_key(labels), 0) + amount
+
+@contextmanager
+def _timer(name, labels):
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        observe(name, time.perf_counter() - started, outcome=outcome, **labels)
+
+def timed(name, **labels):
+    """Context manager recording how long its block took, with outcome="ok" or "error" """
+    if not METRICS_ENABLED:
+        return nullcontext()
+    return _timer(name, labels)
+
+def add_collector(collect):
+    """Register a callable returning [(name, 'counter'|'gauge', labels, value)], called on each scrape"""
+    _collectors.append(collect)
+
+def cache_collector(name, stats):
+    """Collector for a cache whose stats() has 'hits' and 'misses'"""
+    def collect():
+        numbers = stats()
+        hits, misses = numbers['hits'], numbers['misses']
+        samples = [('cache_hits_total', 'counter', {'cache': name}, hits),
+                   ('cache_misses_total', 'counter', {'cache': name}, misses)]
+        if hits + misses:
+            samples.append(('cache_hit_ratio', 'gauge', {'cache': name}, hits / (hits + misses)))
+        return samples
+    return collect
+
+# ---------- EXPOSITION ----------
+def _labels_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+def _header(lines, name, kind):
+    if name in HELP:
+        lines.append(f"# HELP {name} {HELP[name]}")
+    lines.append(f"# TYPE {name} {kind}")
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        histograms = {name: {labels: list(values) for labels, values in series.items()}
+                      for name, series in _histograms.items()}
+        counters = {name: dict(series) for name, series in _counters.items()}
+
+    for name, series in sorted(histograms.items()):
+        _header(lines, name, "histogram")
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels_text(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels_text(labels)} {values[-1]}")
+            lines.append(f"{name}_count{_labels_text(labels)} {cumulative}")
+
+    collected = {}
+    for collect in _collectors:
+        try:
+            for name, kind, labels, value in collect():
+                collected.setdefault((name, kind), []).append((_key(labels), value))
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+    for name, series in counters.items():
+        collected.setdefault((name, "counter"), []).extend(series.items())
+
+    for (name, kind), samples in sorted(collected.items()):
+        _header(lines, name, kind)
+        for labels, value in sorted(samples, key=lambda sample: sample[0]):
+            lines.append(f"{name}{_labels_text(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,109 @@
+import time
+import threading
+from collections import OrderedDict, deque
+
+# ================= PREFETCH POOL =================
+class PrefetchPool:
+    """Per-key queues of ready-to-serve items, refilled in the background.
+
+    produce(key) returns a list of raw values for key (e.g. one LLM batch) and
+    prepare(key, raw) turns each one into a ready item (e.g. renders its
+    audio). pop() is O(1) and never blocks on produce; refill() tops a queue
+    back up to `depth` on the executor, preparing any raw seeds passed in
+    (e.g. leftovers of a batch) first. Keys that are not used for `ttl`
+    seconds, and the least recently used keys beyond `max_keys`, are dropped
+    with their items.
+    """
+
+    def __init__(self, produce, executor, prepare=None, depth=3, max_keys=2000, ttl=1800):
+        self.produce = produce
+        self.prepare = prepare or (lambda key, raw: raw)
+        self.executor = executor
+        self.depth = depth
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.queues = OrderedDict()  # Format: {key: {'items': deque(), 'used': t}}
+        self.refilling = set()
+        self.hits = 0
+        self.misses = 0
+
+    def pop(self, key):
+        """Next ready item for key, or None"""
+        with self.lock:
+            entry = self.queues.get(key)
+            if entry and entry['items']:
+                self.hits += 1
+                entry['used'] = time.time()
+                self.queues.move_to_end(key)
+                return entry['items'].popleft()
+            self.misses += 1
+            return None
+
+    def queued(self, key):
+        """Items currently waiting for key"""
+        with self.lock:
+            entry = self.queues.get(key)
+            return list(entry['items']) if entry else []
+
+    def refill(self, key, seeds=None):
+        """Top the queue for key back up in the background; seeds are prepared first"""
+        with self.lock:
+            entry = self._entry(key)
+            if key in self.refilling or (not seeds and len(entry['items']) >= self.depth):
+                return
+            self.refilling.add(key)
+        self.executor.submit(self._fill, key, list(seeds or []))
+
+    def _entry(self, key):
+        entry = self.queues.get(key)
+        if entry is None:
+            entry = self.queues[key] = {'items': deque(), 'used': time.time()}
+        entry['used'] = time.time()
+        self.queues.move_to_end(key)
+        self._evict()
+        return entry
+
+    def _evict(self):
+        now = time.time()
+        while self.queues:
+            key, entry = next(iter(self.queues.items()))
+            if len(self.queues) <= self.max_keys and entry['used'] >= now - self.ttl:
+                break
+            del self.queues[key]
+
+    def _fill(self, key, pending):
+        try:
+            pending = deque(pending)
+            while True:
+                with self.lock:
+                    entry = self.queues.get(key)
+                    # A batch (or seed list) is already paid for, so all of it is kept
+                    if entry is None or (not pending and len(entry['items']) >= self.depth):
+                        return
+                if not pending:
+                    pending.extend(self.produce(key) or [])
+                    if not pending:
+                        return
+                item = self.prepare(key, pending.popleft())
+                with self.lock:
+                    entry = self.queues.get(key)
+                    if entry is None:
+                        return
+                    entry['items'].append(item)
+        except Exception as e:
+            print(f"Error prefetching {key}: {e}")
+        finally:
+            with self.lock:
+                self.refilling.discard(key)
+
+    def discard_user(self, user_id):
+        """Drop every queue whose key starts with user_id"""
+        with self.lock:
+            for key in [k for k in self.queues if k[0] == user_id]:
+                del self.queues[key]
+
+    def stats(self):
+        with self.lock:
+            return {'keys': len(self.queues), 'items': sum(len(e['items']) for e in self.queues.values()),
+                    'hits': self.hits, 'misses': self.misses}
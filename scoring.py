@@ -0,0 +1,247 @@
+import re
+from functools import lru_cache
+
+from alignment import align_words, ratio, MATCH, SUBSTITUTE, DELETE, INSERT
+
+# ================= SPOKEN ATTEMPT SCORING =================
+# Scores a speech-to-text transcript against the expected sentence.
+# Both sides are normalized first (numbers spelled out, contractions
+# expanded, punctuation dropped), so "I'm 4" and "I am four" are the same
+# attempt. Spoken homophones of an expected word (from the HOMOPHONES table,
+# e.g. "their"/"there", "write"/"right") are treated as that word before the
+# word alignment, so ASR spelling choices are not marked as mispronunciations.
+# Other spoken words earn full credit only if they keep the expected word's
+# vowel sounds and nearly all of its spelling ("colour"/"color"), so a minimal
+# pair such as "ship"/"shop" is still a mistake.
+#
+# The score is the word-level analogue of SequenceMatcher.ratio():
+#   2 * credit / (expected words + spoken words)
+# where each aligned pair earns 1 for an exact, homophone or sound-alike word and its
+# character ratio otherwise. It is on the same 0..1 scale as before, so the
+# existing star thresholds still apply.
+
+# Words with the same phonetic key must share more than this much spelling to
+# count as sound-alikes. One changed letter in a four-letter word is exactly
+# 0.75, so "pull"/"pill" never qualifies on spelling alone.
+PHONETIC_MIN_RATIO = 0.75
+
+# Common homophones whose spelling differs too much for the ratio check
+HOMOPHONES = [
+    ("to", "too", "two"), ("there", "their"), ("right", "write"), ("son", "sun"), ("see", "sea"),
+    ("know", "no"), ("one", "won"), ("eight", "ate"), ("our", "hour"), ("flower", "flour"), ("hole", "whole"),
+    ("would", "wood"), ("wear", "where"), ("which", "witch"), ("weak", "week"), ("road", "rode"),
+    ("read", "red"), ("made", "maid"), ("pair", "pear"), ("peace", "piece"), ("bear", "bare"),
+    ("tail", "tale"), ("sail", "sale"), ("mail", "male"), ("plain", "plane"), ("dear", "deer"),
+]
+
+CONTRACTIONS = {
+    "i'm": "i am", "you're": "you are", "we're": "we are", "they're": "they are",
+    "i've": "i have", "you've": "you have", "we've": "we have", "they've": "they have",
+    "i'll": "i will", "you'll": "you will", "he'll": "he will", "she'll": "she will",
+    "we'll": "we will", "they'll": "they will", "it'll": "it will",
+    "i'd": "i would", "you'd": "you would", "he'd": "he would", "she'd": "she would",
+    "we'd": "we would", "they'd": "they would",
+    "it's": "it is", "he's": "he is", "she's": "she is", "that's": "that is",
+    "there's": "there is", "what's": "what is", "where's": "where is", "who's": "who is",
+    "here's": "here is", "let's": "let us",
+    "isn't": "is not", "aren't": "are not", "wasn't": "was not", "weren't": "were not",
+    "don't": "do not", "doesn't": "does not", "didn't": "did not",
+    "haven't": "have not", "hasn't": "has not", "hadn't": "had not",
+    "can't": "can not", "cannot": "can not", "couldn't": "could not",
+    "won't": "will not", "wouldn't": "would not", "shouldn't": "should not",
+    "mustn't": "must not",
+    "gonna": "going to", "wanna": "want to", "gotta": "got to",
+}
+
+ONES = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+        "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+        "eighteen", "nineteen"]
+TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+ORDINALS = {"one": "first", "two": "second", "three": "third", "five": "fifth", "eight": "eighth",
+            "nine": "ninth", "twelve": "twelfth"}
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+ORDINAL_PATTERN = re.compile(r"^(\d+)(st|nd|rd|th)$")
+
+# ---------- NORMALIZATION ----------
+def number_words(n):
+    """0..999999 spelled out, as a list of words"""
+    if n < 20:
+        return [ONES[n]]
+    if n < 100:
+        return [TENS[n // 10]] + ([ONES[n % 10]] if n % 10 else [])
+    if n < 1000:
+        return [ONES[n // 100], "hundred"] + (number_words(n % 100) if n % 100 else [])
+    return number_words(n // 1000) + ["thousand"] + (number_words(n % 1000) if n % 1000 else [])
+
+def ordinal_words(n):
+    words = number_words(n)
+    last = words[-1]
+    if last in ORDINALS:
+        last = ORDINALS[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return words[:-1] + [last]
+
+@lru_cache(maxsize=65536)
+def normalize_token(token):
+    """One raw token as a tuple of normalized words"""
+    if token in CONTRACTIONS:
+        return tuple(CONTRACTIONS[token].split())
+    if token.isdigit() and len(token) <= 6:
+        return tuple(number_words(int(token)))
+    match = ORDINAL_PATTERN.match(token)
+    if match and len(match.group(1)) <= 6:
+        return tuple(ordinal_words(int(match.group(1))))
+    token = token.strip("'")
+    return (token,) if token else ()
+
+def normalize_words(text):
+    """Lowercase words with numbers spelled out and contractions expanded"""
+    text = text.lower().replace("’", "'")
+    words = []
+    for token in WORD_PATTERN.findall(re.sub(r"(?<=\d),(?=\d)", "", text)):
+        words.extend(normalize_token(token))
+    return words
+
+# ---------- PHONETIC KEYS ----------
+# A compact Metaphone-style key: spelling patterns are mapped to sounds, a
+# silent final "e" is dropped, each run of vowels keeps its first vowel and
+# repeated sounds collapse. Vowels are kept so "ship", "shop" and "sheep"
+# ("ksip", "ksop", "ksep") stay apart.
+PHONETIC_RULES = [(re.compile(pattern), replacement) for pattern, replacement in [
+    (r"^(kn|gn|pn|wr|ps)", lambda m: m.group(0)[1]),
+    (r"^x", "s"),
+    (r"^wh", "w"),
+    (r"mb$", "m"),
+    (r"tch", "ch"),
+    (r"sch", "sk"),
+    (r"ph", "f"),
+    (r"ck", "k"),
+    (r"sh|ti(?=[ao])|ci(?=a)", "x"),
+    (r"ch", "x"),
+    (r"c(?=[iey])", "s"),
+    (r"c|q", "k"),
+    (r"dg(?=[iey])", "j"),
+    (r"d", "t"),
+    (r"gh(?![aeiou])", ""),
+    (r"gn$", "n"),
+    (r"g(?=[iey])", "j"),
+    (r"th", "0"),
+    (r"v", "f"),
+    (r"x", "ks"),
+    (r"z", "s"),
+    (r"(?<=[aeiou])h(?![aeiou])", ""),
+    (r"[wy](?![aeiou])", ""),
+]]
+
+# Format: {word: key}, precomputed for the content vocabulary. Homophone
+# groups share a key starting with "=", which skips the spelling check.
+PHONETIC_INDEX = {word: "=" + group[0] for group in HOMOPHONES for word in group}
+
+def _compute_key(word):
+    letters = re.sub(r"[^a-z]", "", word)
+    if not letters:
+        return word
+    for pattern, replacement in PHONETIC_RULES:
+        letters = pattern.sub(replacement, letters)
+    if not letters:
+        return word
+    if re.search(r"[aeiou]", letters[:-1]):
+        letters = re.sub(r"(?<=[^aeiou])e$", "", letters)
+    letters = re.sub(r"([aeiou])[aeiou]+", r"\1", letters)
+    return re.sub(r"(.)\1+", r"\1", letters)
+
+def phonetic_key(word):
+    """Sound-alike key for a normalized word"""
+    key = PHONETIC_INDEX.get(word)
+    if key is None:
+        key = _cached_key(word)
+    return key
+
+@lru_cache(maxsize=65536)
+def _cached_key(word):
+    return _compute_key(word)
+
+def index_vocabulary(texts):
+    """Precompute phonetic keys for every word in texts (sentences or single words)"""
+    for text in texts:
+        for word in normalize_words(text):
+            if word not in PHONETIC_INDEX:
+                PHONETIC_INDEX[word] = _compute_key(word)
+    return len(PHONETIC_INDEX)
+
+def is_homophone(spoken, expected):
+    """Same word, or listed together in HOMOPHONES"""
+    if spoken == expected:
+        return True
+    key = PHONETIC_INDEX.get(spoken)
+    return key is not None and key.startswith("=") and key == PHONETIC_INDEX.get(expected)
+
+def sounds_alike(spoken, expected):
+    if is_homophone(spoken, expected):
+        return True
+    key = phonetic_key(spoken)
+    if key.startswith("=") or key != phonetic_key(expected):
+        return False
+    return ratio(spoken, expected) > PHONETIC_MIN_RATIO
+
+# ---------- SCORING ----------
+def score_attempt(student_text, correct_text):
+    """Score a transcript: {'score': 0..1, 'ops': [(op, expected, spoken, credit)]}"""
+    expected = normalize_words(correct_text)
+    spoken = normalize_words(student_text)
+    if not expected or not spoken:
+        return {"score": 0.0, "ops": [(DELETE, word, None, 0.0) for word in expected] +
+                                     [(INSERT, None, word, 0.0) for word in spoken]}
+
+    # Homophones become the expected word, so the alignment sees them as exact matches
+    by_key = {}
+    for word in expected:
+        key = phonetic_key(word)
+        if key.startswith("="):
+            by_key.setdefault(key, []).append(word)
+    expected_set = set(expected)
+    heard = []
+    for word in spoken:
+        if word not in expected_set:
+            candidates = by_key.get(phonetic_key(word), ())
+            if candidates:
+                word = candidates[0]
+        heard.append(word)
+
+    ops = []
+    credit = 0.0
+    position = 0  # Index into spoken, to report what was actually said
+    for op, expected_word, heard_word in align_words(heard, expected):
+        spoken_word = None
+        if heard_word is not None:
+            spoken_word = spoken[position]
+            position += 1
+        if op == MATCH and (spoken_word == expected_word or heard_word != spoken_word):
+            value = 1.0  # Exact or homophone
+        elif op in (MATCH, SUBSTITUTE) and sounds_alike(spoken_word, expected_word):
+            value = 1.0  # Same sounds, slightly different spelling
+        elif op in (MATCH, SUBSTITUTE):
+            # Near misses and wrong words earn their spelling similarity
+            value = ratio(spoken_word, expected_word)
+        else:
+            value = 0.0
+        credit += value
+        ops.append((op, expected_word, spoken_word, value))
+
+    return {"score": 2.0 * credit / (len(expected) + len(spoken)), "ops": ops}
+
+def score_attempts(pairs):
+    """score_attempt for a list of (student_text, correct_text); repeated pairs are scored once.
+
+    Each alignment depends only on its own pair, so apart from duplicates there is
+    no work to share between pairs: this is a dedupe-and-loop, not a vectorized scorer.
+    """
+    scored = {}
+    for pair in pairs:
+        if pair not in scored:
+            scored[pair] = score_attempt(*pair)
+    return [scored[pair] for pair in pairs]
@@ -0,0 +1,725 @@
+import os
+import json
+import uuid
+import atexit
+import sqlite3
+import threading
+import metrics
+
+# ================= STORAGE =================
+# All student/teacher persistence goes through a UserStore so the routes do
+# not care where the data lives. STORAGE_BACKEND picks the engine:
+#   sqlite - one shared database file in WAL mode (default), safe across gunicorn workers
+#   json   - the original users_data.json / teachers_data.json files
+USERS_JSON_PATH = 'users_data.json'
+TEACHERS_JSON_PATH = 'teachers_data.json'
+
+class UserStore:
+    """Repository interface for students and teachers"""
+
+    def get_user(self, user_id):
+        """Student record (with mode_stats) or None"""
+        raise NotImplementedError
+
+    def create_user(self, user_id, data):
+        """Insert a student; returns False if the ID is taken"""
+        raise NotImplementedError
+
+    def add_progress(self, user_id, stars_earned, mode, level_for_xp, now):
+        """Add stars/XP and bump mode stats; returns (old_level, new_level) or None"""
+        raise NotImplementedError
+
+    def apply_progress_batch(self, updates, level_for_xp):
+        """Apply coalesced deltas: {user_id: {'xp', 'stars', 'modes': {mode: {'stars', 'sessions'}}, 'last_active'}}"""
+        raise NotImplementedError
+
+    def touch_user(self, user_id, now):
+        """Update last_active"""
+        raise NotImplementedError
+
+    def all_users(self):
+        """Every student as {user_id: record}"""
+        raise NotImplementedError
+
+    def query_students(self, filters, sort='total_xp', descending=True, after=None, limit=50):
+        """One page of students as [(user_id, record)], ordered by sort then user_id.
+
+        filters may hold 'class', 'division', 'inactive_since' (last_active before it),
+        'min_level' and 'max_level'; after is (sort value, user_id) of the previous page's last student.
+        """
+        raise NotImplementedError
+
+    def class_summaries(self, filters, after=None, limit=50):
+        """One page of per-class totals ordered by (class, division); after is the previous page's last pair"""
+        raise NotImplementedError
+
+    def get_teacher(self, username):
+        raise NotImplementedError
+
+    def create_teacher(self, username, data):
+        """Insert a teacher; returns False if the username is taken"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+# ---------- JSON FILES ----------
+class JSONUserStore(UserStore):
+    """The original storage: whole-file JSON dumps"""
+
+    def __init__(self, users_path=USERS_JSON_PATH, teachers_path=TEACHERS_JSON_PATH):
+        self.users_path = users_path
+        self.teachers_path = teachers_path
+        self.lock = threading.RLock()
+        self.users = {}
+        self.teachers = {}
+        self.load()
+
+    def load(self):
+        """Load databases from JSON files"""
+        try:
+            if os.path.exists(self.users_path):
+                with open(self.users_path, 'r') as f:
+                    self.users = json.load(f)
+            if os.path.exists(self.teachers_path):
+                with open(self.teachers_path, 'r') as f:
+                    self.teachers = json.load(f)
+        except Exception as e:
+            print(f"Error loading database: {e}")
+            self.users = {}
+            self.teachers = {}
+
+    def save(self):
+        """Save databases to JSON files (temp file + rename, so a crash keeps the old copy)"""
+        try:
+            with metrics.timed("store_write_seconds", op="json_save"):
+                _atomic_json_dump(self.users, self.users_path)
+                _atomic_json_dump(self.teachers, self.teachers_path)
+        except Exception as e:
+            print(f"Error saving database: {e}")
+
+    def get_user(self, user_id):
+        with self.lock:
+            user = self.users.get(user_id)
+            return json.loads(json.dumps(user)) if user is not None else None
+
+    def create_user(self, user_id, data):
+        with self.lock:
+            if user_id in self.users:
+                return False
+            self.users[user_id] = dict(data, mode_stats=dict(data.get('mode_stats', {})))
+            self.save()
+            return True
+
+    def add_progress(self, user_id, stars_earned, mode, level_for_xp, now):
+        with self.lock:
+            user = self.users.get(user_id)
+            if user is None:
+                return None
+            old_level = user['level']
+            _apply_update(user, progress_update(stars_earned, mode, now), level_for_xp)
+            self.save()
+            return old_level, user['level']
+
+    def apply_progress_batch(self, updates, level_for_xp):
+        with self.lock:
+            for user_id, update in updates.items():
+                if user_id in self.users:
+                    _apply_update(self.users[user_id], update, level_for_xp)
+            self.save()
+
+    def touch_user(self, user_id, now):
+        with self.lock:
+            if user_id in self.users:
+                self.users[user_id]['last_active'] = now
+                self.save()
+
+    def all_users(self):
+        with self.lock:
+            return json.loads(json.dumps(self.users))
+
+    def query_students(self, filters, sort='total_xp', descending=True, after=None, limit=50):
+        with self.lock:
+            users = [(user_id, user) for user_id, user in self.users.items() if _matches_filters(user, filters)]
+            page = _page_students(users, sort, descending, after, limit)
+            return json.loads(json.dumps(page))
+
+    def class_summaries(self, filters, after=None, limit=50):
+        with self.lock:
+            return _summarize_classes(self.users.values(), filters, after, limit)
+
+    def get_teacher(self, username):
+        with self.lock:
+            teacher = self.teachers.get(username)
+            return dict(teacher) if teacher is not None else None
+
+    def create_teacher(self, username, data):
+        with self.lock:
+            if username in self.teachers:
+                return False
+            self.teachers[username] = dict(data)
+            self.save()
+            return True
+
+# ---------- SQLITE ----------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    name TEXT NOT NULL,
+    class TEXT NOT NULL,
+    division TEXT NOT NULL,
+    total_xp INTEGER NOT NULL DEFAULT 0,
+    total_stars INTEGER NOT NULL DEFAULT 0,
+    level INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT,
+    last_active TEXT NOT NULL DEFAULT ''
+);
+DROP INDEX IF EXISTS idx_users_class;
+CREATE INDEX IF NOT EXISTS idx_users_class_xp ON users (class, division, total_xp, user_id);
+CREATE INDEX IF NOT EXISTS idx_users_last_active ON users (last_active);
+CREATE INDEX IF NOT EXISTS idx_users_level ON users (level, user_id);
+CREATE INDEX IF NOT EXISTS idx_users_xp ON users (total_xp, user_id);
+CREATE TABLE IF NOT EXISTS mode_stats (
+    user_id TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    stars INTEGER NOT NULL DEFAULT 0,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, mode)
+);
+CREATE TABLE IF NOT EXISTS teachers (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    name TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'teacher',
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+USER_COLUMNS = ("user_id", "password", "name", "class", "division", "total_xp",
+                "total_stars", "level", "created_at", "last_active")
+
+def connect_sqlite(local, path):
+    """This thread's connection to the SQLite file at path, kept on `local` (a threading.local).
+
+    Autocommit, so transactions are explicit (BEGIN IMMEDIATE), and WAL, so
+    readers in other workers don't block the writer.
+    """
+    conn = getattr(local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        local.conn = conn
+    return conn
+
+class SQLiteUserStore(UserStore):
+    """Students and teachers in one SQLite file, updated row by row"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self.connect()
+        conn.executescript(SCHEMA)
+        # Databases created before last_active was NOT NULL: never active is '', so it sorts and compares bare
+        conn.execute("UPDATE users SET last_active = '' WHERE last_active IS NULL")
+
+    def connect(self):
+        """One connection per thread"""
+        return connect_sqlite(self.local, self.path)
+
+    def transaction(self):
+        return _Transaction(self.connect())
+
+    def _user_record(self, conn, row):
+        user = {key: row[key] for key in USER_COLUMNS if key != 'user_id'}
+        user['mode_stats'] = {}
+        for stat in conn.execute("SELECT mode, stars, sessions FROM mode_stats WHERE user_id = ?",
+                                 (row['user_id'],)):
+            user['mode_stats'][stat['mode']] = {'stars': stat['stars'], 'sessions': stat['sessions']}
+        return user
+
+    def get_user(self, user_id):
+        conn = self.connect()
+        row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return self._user_record(conn, row) if row is not None else None
+
+    def create_user(self, user_id, data):
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone():
+                return False
+            self._insert_user(conn, user_id, data)
+            return True
+
+    def _insert_user(self, conn, user_id, data):
+        conn.execute(
+            "INSERT OR IGNORE INTO users (user_id, password, name, class, division, total_xp, "
+            "total_stars, level, created_at, last_active) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, data['password'], data['name'], str(data['class']), str(data['division']),
+             data.get('total_xp', 0), data.get('total_stars', 0), data.get('level', 1),
+             data.get('created_at'), data.get('last_active') or ''))
+        for mode, stats in data.get('mode_stats', {}).items():
+            conn.execute("INSERT OR IGNORE INTO mode_stats (user_id, mode, stars, sessions) VALUES (?, ?, ?, ?)",
+                         (user_id, mode, stats.get('stars', 0), stats.get('sessions', 0)))
+
+    def add_progress(self, user_id, stars_earned, mode, level_for_xp, now):
+        with metrics.timed("store_write_seconds", op="add_progress"), self.transaction() as conn:
+            row = conn.execute("SELECT level, total_xp FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return None
+            old_level = row['level']
+            new_level = level_for_xp(row['total_xp'] + stars_earned)
+            conn.execute(
+                "UPDATE users SET total_xp = total_xp + ?, total_stars = total_stars + ?, "
+                "level = ?, last_active = ? WHERE user_id = ?",
+                (stars_earned, stars_earned, new_level, now, user_id))
+            conn.execute(
+                "INSERT INTO mode_stats (user_id, mode, stars, sessions) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (user_id, mode) DO UPDATE SET stars = stars + excluded.stars, "
+                "sessions = sessions + 1",
+                (user_id, mode, stars_earned))
+            return old_level, new_level
+
+    def apply_progress_batch(self, updates, level_for_xp):
+        with metrics.timed("store_write_seconds", op="progress_batch"), self.transaction() as conn:
+            for user_id, update in updates.items():
+                row = conn.execute("SELECT total_xp, level FROM users WHERE user_id = ?", (user_id,)).fetchone()
+                if row is None:
+                    continue
+                new_level = level_for_xp(row['total_xp'] + update['xp']) if level_for_xp else row['level']
+                conn.execute(
+                    "UPDATE users SET total_xp = total_xp + ?, total_stars = total_stars + ?, "
+                    "level = ?, last_active = COALESCE(?, last_active) WHERE user_id = ?",
+                    (update['xp'], update['stars'], new_level, update['last_active'], user_id))
+                for mode, stats in update['modes'].items():
+                    conn.execute(
+                        "INSERT INTO mode_stats (user_id, mode, stars, sessions) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (user_id, mode) DO UPDATE SET stars = stars + excluded.stars, "
+                        "sessions = sessions + excluded.sessions",
+                        (user_id, mode, stats['stars'], stats['sessions']))
+
+    def touch_user(self, user_id, now):
+        self.connect().execute("UPDATE users SET last_active = ? WHERE user_id = ?", (now, user_id))
+
+    def all_users(self):
+        conn = self.connect()
+        users = {}
+        for row in conn.execute("SELECT * FROM users"):
+            user = {key: row[key] for key in USER_COLUMNS if key != 'user_id'}
+            user['mode_stats'] = {}
+            users[row['user_id']] = user
+        for stat in conn.execute("SELECT user_id, mode, stars, sessions FROM mode_stats"):
+            if stat['user_id'] in users:
+                users[stat['user_id']]['mode_stats'][stat['mode']] = {
+                    'stars': stat['stars'], 'sessions': stat['sessions']}
+        return users
+
+    def query_students(self, filters, sort='total_xp', descending=True, after=None, limit=50):
+        column = STUDENT_SORT_COLUMNS[sort]
+        where, params = _filter_clauses(filters)
+        if after is not None:
+            # Keyset pagination: rows strictly after the previous page's last (value, user_id)
+            where.append(f"({column}, user_id) {'<' if descending else '>'} (?, ?)")
+            params += [after[0], after[1]]
+        direction = "DESC" if descending else "ASC"
+        sql = "SELECT * FROM users"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {column} {direction}, user_id {direction} LIMIT ?"
+        conn = self.connect()
+        rows = conn.execute(sql, params + [limit]).fetchall()
+        page = [(row['user_id'], {key: row[key] for key in USER_COLUMNS if key != 'user_id'}) for row in rows]
+        if page:
+            records = dict(page)
+            for record in records.values():
+                record['mode_stats'] = {}
+            marks = ", ".join("?" * len(records))
+            for stat in conn.execute(f"SELECT user_id, mode, stars, sessions FROM mode_stats "
+                                     f"WHERE user_id IN ({marks})", list(records)):
+                records[stat['user_id']]['mode_stats'][stat['mode']] = {
+                    'stars': stat['stars'], 'sessions': stat['sessions']}
+        return page
+
+    def class_summaries(self, filters, after=None, limit=50):
+        where, params = _filter_clauses(filters)
+        if after is not None:
+            where.append("(class, division) > (?, ?)")
+            params += [str(after[0]), str(after[1])]
+        sql = ("SELECT class, division, COUNT(*) AS students, SUM(total_xp) AS total_xp, "
+               "SUM(total_stars) AS total_stars, AVG(level) AS average_level, "
+               "NULLIF(MAX(last_active), '') AS last_active FROM users")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " GROUP BY class, division ORDER BY class, division LIMIT ?"
+        return [{'class': row['class'], 'division': row['division'], 'students': row['students'],
+                 'total_xp': row['total_xp'], 'total_stars': row['total_stars'],
+                 'average_level': round(row['average_level'], 2), 'last_active': row['last_active']}
+                for row in self.connect().execute(sql, params + [limit])]
+
+    def get_teacher(self, username):
+        row = self.connect().execute("SELECT * FROM teachers WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+        return {'password': row['password'], 'name': row['name'], 'role': row['role'],
+                'created_at': row['created_at']}
+
+    def create_teacher(self, username, data):
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM teachers WHERE username = ?", (username,)).fetchone():
+                return False
+            self._insert_teacher(conn, username, data)
+            return True
+
+    def _insert_teacher(self, conn, username, data):
+        conn.execute("INSERT OR IGNORE INTO teachers (username, password, name, role, created_at) "
+                     "VALUES (?, ?, ?, ?, ?)",
+                     (username, data['password'], data['name'], data.get('role', 'teacher'),
+                      data.get('created_at')))
+
+    def migrate_from_json(self, users_path=USERS_JSON_PATH, teachers_path=TEACHERS_JSON_PATH, force=False):
+        """One-shot import of the JSON files; returns (students, teachers) imported"""
+        users = teachers = {}
+        try:
+            if os.path.exists(users_path):
+                with open(users_path, 'r') as f:
+                    users = json.load(f)
+            if os.path.exists(teachers_path):
+                with open(teachers_path, 'r') as f:
+                    teachers = json.load(f)
+        except Exception as e:
+            print(f"Error reading JSON database for migration: {e}")
+            return 0, 0
+
+        with self.transaction() as conn:
+            # Checked inside the write transaction so parallel workers migrate once
+            done = conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+            if done and not force:
+                return 0, 0
+            before_users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            before_teachers = conn.execute("SELECT COUNT(*) FROM teachers").fetchone()[0]
+            for user_id, data in users.items():
+                self._insert_user(conn, user_id, data)
+            for username, data in teachers.items():
+                self._insert_teacher(conn, username, data)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', '1')")
+            return (conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] - before_users,
+                    conn.execute("SELECT COUNT(*) FROM teachers").fetchone()[0] - before_teachers)
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+# ---------- HELPERS ----------
+# Sort keys accepted by query_students, and the SQL they order by
+STUDENT_SORT_COLUMNS = {
+    'total_xp': "total_xp", 'level': "level", 'total_stars': "total_stars",
+    'last_active': "last_active", 'name': "name", 'user_id': "user_id",
+}
+
+def _filter_clauses(filters):
+    """SQL conditions and parameters for query_students/class_summaries filters"""
+    where, params = [], []
+    if filters.get('class') is not None:
+        where.append("class = ?")
+        params.append(str(filters['class']))
+    if filters.get('division') is not None:
+        where.append("division = ?")
+        params.append(str(filters['division']))
+    if filters.get('inactive_since') is not None:
+        where.append("last_active < ?")
+        params.append(filters['inactive_since'])
+    if filters.get('min_level') is not None:
+        where.append("level >= ?")
+        params.append(filters['min_level'])
+    if filters.get('max_level') is not None:
+        where.append("level <= ?")
+        params.append(filters['max_level'])
+    return where, params
+
+def _matches_filters(user, filters):
+    """The same filters as _filter_clauses, for an in-memory record"""
+    if filters.get('class') is not None and str(user['class']) != str(filters['class']):
+        return False
+    if filters.get('division') is not None and str(user['division']) != str(filters['division']):
+        return False
+    if filters.get('inactive_since') is not None and (user.get('last_active') or '') >= filters['inactive_since']:
+        return False
+    if filters.get('min_level') is not None and user['level'] < filters['min_level']:
+        return False
+    if filters.get('max_level') is not None and user['level'] > filters['max_level']:
+        return False
+    return True
+
+def _sort_value(user, sort):
+    if sort == 'last_active':
+        return user.get('last_active') or ''
+    return user[sort]
+
+def _page_students(users, sort, descending, after, limit):
+    """query_students over in-memory (user_id, record) pairs"""
+    def key(item):
+        return _sort_value(item[1], sort) if sort != 'user_id' else item[0], item[0]
+    users = sorted(users, key=key, reverse=descending)
+    if after is not None:
+        after = tuple(after)
+        users = [item for item in users if (key(item) < after if descending else key(item) > after)]
+    return users[:limit]
+
+def _summarize_classes(users, filters, after, limit):
+    """class_summaries over in-memory records"""
+    classes = {}
+    for user in users:
+        if not _matches_filters(user, filters):
+            continue
+        pair = (str(user['class']), str(user['division']))
+        summary = classes.setdefault(pair, {'class': pair[0], 'division': pair[1], 'students': 0,
+                                            'total_xp': 0, 'total_stars': 0, 'average_level': 0,
+                                            'last_active': None})
+        summary['students'] += 1
+        summary['total_xp'] += user['total_xp']
+        summary['total_stars'] += user['total_stars']
+        summary['average_level'] += user['level']
+        if (user.get('last_active') or '') > (summary['last_active'] or ''):
+            summary['last_active'] = user['last_active']
+    page = []
+    for pair in sorted(classes):
+        if after is not None and pair <= (str(after[0]), str(after[1])):
+            continue
+        summary = classes[pair]
+        summary['average_level'] = round(summary['average_level'] / summary['students'], 2)
+        page.append(summary)
+        if len(page) >= limit:
+            break
+    return page
+
+def _atomic_json_dump(data, path):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def progress_update(stars_earned, mode, now):
+    """A single progress delta in apply_progress_batch format"""
+    update = {'xp': stars_earned, 'stars': stars_earned, 'modes': {}, 'last_active': now}
+    if mode:
+        update['modes'][mode] = {'stars': stars_earned, 'sessions': 1}
+    return update
+
+def _merge_update(into, update):
+    into['xp'] += update['xp']
+    into['stars'] += update['stars']
+    for mode, stats in update['modes'].items():
+        merged = into['modes'].setdefault(mode, {'stars': 0, 'sessions': 0})
+        merged['stars'] += stats['stars']
+        merged['sessions'] += stats['sessions']
+    if update['last_active']:
+        into['last_active'] = update['last_active']
+
+def _apply_update(user, update, level_for_xp):
+    """Apply a delta to a user record in place"""
+    user['total_xp'] += update['xp']
+    user['total_stars'] += update['stars']
+    if level_for_xp:
+        user['level'] = level_for_xp(user['total_xp'])
+    if update['last_active']:
+        user['last_active'] = update['last_active']
+    for mode, stats in update['modes'].items():
+        merged = user['mode_stats'].setdefault(mode, {'stars': 0, 'sessions': 0})
+        merged['stars'] += stats['stars']
+        merged['sessions'] += stats['sessions']
+
+# ---------- WRITE-BEHIND ----------
+class BackgroundFlusher:
+    """Daemon thread that calls flush() every `interval` seconds, or sooner when woken"""
+
+    def __init__(self, flush, interval):
+        self.flush = flush
+        self.interval = interval
+        self.event = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def start(self):
+        # Started lazily and per process, so forked gunicorn workers get their own thread
+        if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def wake(self):
+        self.event.set()
+
+    def _run(self):
+        while True:
+            self.event.wait(self.interval)
+            self.event.clear()
+            self.flush()
+
+class WriteBehindStore(UserStore):
+    """Queues progress writes and flushes them in batches on a background thread.
+
+    Deltas for the same student are coalesced, so a busy classroom costs one
+    write per flush instead of one per star. Reads overlay the pending deltas
+    and the batch currently being written, so within this process a student
+    always sees their own progress immediately. Other worker processes only
+    see it after the flush (at most `interval` seconds), except for level
+    changes, which are flushed right away.
+    """
+
+    def __init__(self, inner, interval=1.0, batch_size=50):
+        self.inner = inner
+        self.interval = interval
+        self.batch_size = batch_size
+        # Reentrant: add_progress holds it across get_user and _enqueue
+        self.lock = threading.RLock()
+        self.pending = {}   # Format: {user_id: update}
+        self.flushing = {}  # Format: {user_id: update}, the batch flush() is writing
+        self.flush_lock = threading.Lock()
+        self.level_for_xp = None
+        self.flusher = BackgroundFlusher(self.flush, interval)
+        atexit.register(self.flush)
+
+    def _enqueue(self, user_id, update, level_for_xp):
+        with self.lock:
+            self.level_for_xp = level_for_xp or self.level_for_xp
+            if user_id in self.pending:
+                _merge_update(self.pending[user_id], update)
+            else:
+                self.pending[user_id] = update
+            dirty = len(self.pending)
+            self.flusher.start()
+        if dirty >= self.batch_size:
+            self.flusher.wake()
+
+    def flush(self):
+        """Write every pending delta to the underlying store"""
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return
+                # Kept readable in self.flushing until the write has committed
+                batch = self.flushing = self.pending
+                self.pending = {}
+                level_for_xp = self.level_for_xp
+            try:
+                self.inner.apply_progress_batch(batch, level_for_xp)
+            except Exception as e:
+                print(f"Error flushing progress: {e}")
+                # Put the batch back in front of anything queued meanwhile
+                with self.lock:
+                    for user_id, update in self.pending.items():
+                        if user_id in batch:
+                            _merge_update(batch[user_id], update)
+                        else:
+                            batch[user_id] = update
+                    self.pending = batch
+                    self.flushing = {}
+                return
+            with self.lock:
+                self.flushing = {}
+
+    def _overlay(self, user_id, user):
+        with self.lock:
+            if user is not None:
+                for deltas in (self.flushing, self.pending):
+                    update = deltas.get(user_id)
+                    if update is not None:
+                        _apply_update(user, update, self.level_for_xp)
+        return user
+
+    def get_user(self, user_id):
+        return self._overlay(user_id, self.inner.get_user(user_id))
+
+    def create_user(self, user_id, data):
+        return self.inner.create_user(user_id, data)
+
+    def add_progress(self, user_id, stars_earned, mode, level_for_xp, now):
+        # One lock across read, level and enqueue, so concurrent saves for a
+        # student each see the other's stars and report a level-up once
+        with self.lock:
+            user = self.get_user(user_id)
+            if user is None:
+                return None
+            old_level = user['level']
+            new_level = level_for_xp(user['total_xp'] + stars_earned)
+            self._enqueue(user_id, progress_update(stars_earned, mode, now), level_for_xp)
+        if new_level != old_level:
+            # Rare, and other workers should show the new level without waiting for the flusher
+            self.flush()
+        return old_level, new_level
+
+    def apply_progress_batch(self, updates, level_for_xp):
+        for user_id, update in updates.items():
+            self._enqueue(user_id, update, level_for_xp)
+
+    def touch_user(self, user_id, now):
+        self._enqueue(user_id, progress_update(0, None, now), None)
+
+    def all_users(self):
+        return {user_id: self._overlay(user_id, user) for user_id, user in self.inner.all_users().items()}
+
+    def query_students(self, filters, sort='total_xp', descending=True, after=None, limit=50):
+        # Filtering and ordering use the stored values; deltas not yet flushed
+        # (at most one flush interval old) are overlaid on the returned records only
+        return [(user_id, self._overlay(user_id, user))
+                for user_id, user in self.inner.query_students(filters, sort, descending, after, limit)]
+
+    def class_summaries(self, filters, after=None, limit=50):
+        return self.inner.class_summaries(filters, after, limit)
+
+    def get_teacher(self, username):
+        return self.inner.get_teacher(username)
+
+    def create_teacher(self, username, data):
+        return self.inner.create_teacher(username, data)
+
+    def close(self):
+        self.flush()
+        self.inner.close()
+
+def create_store():
+    """Build the store selected by STORAGE_BACKEND"""
+    backend = os.getenv("STORAGE_BACKEND", "sqlite")
+    if backend == "json":
+        store = JSONUserStore()
+    else:
+        if backend != "sqlite":
+            print(f"Unknown STORAGE_BACKEND '{backend}', using sqlite")
+        store = SQLiteUserStore(os.getenv("DATABASE_PATH", "smartspeak.db"))
+        store.migrate_from_json()
+    # STORAGE_WRITE_BEHIND=0 writes synchronously in the request instead
+    if os.getenv("STORAGE_WRITE_BEHIND", "1") == "1":
+        store = WriteBehindStore(store,
+                                 interval=float(os.getenv("STORAGE_FLUSH_INTERVAL", "1.0")),
+                                 batch_size=int(os.getenv("STORAGE_FLUSH_BATCH", "50")))
+    return store
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_bank import WORD_LIMITS, ContentBank, load_content_bank
+
+SENTENCES = ["The cat is here", "A dog runs fast", "I like red apples", "We play in the park",
+             "The sun is hot", "Birds can fly high"]
+DATA = {"categories": {"general": {"description": "everyday life", "sentences": {"easy": SENTENCES}}},
+        "words": {"easy": ["Cat", "dog", "sun", "pen"]}}
+
+@pytest.fixture
+def bank():
+    return ContentBank(DATA, mode="bank")
+
+def test_a_deck_is_dealt_without_repeats(bank):
+    dealt = bank.sample_sentences("u1", "general", "easy", count=4)
+    dealt += bank.sample_sentences("u1", "general", "easy", count=2)
+    assert sorted(dealt) == sorted(SENTENCES)
+
+def test_the_deck_is_reshuffled_once_used_up(bank):
+    for _ in range(3):
+        assert sorted(bank.sample_sentences("u1", "general", "easy", count=len(SENTENCES))) == sorted(SENTENCES)
+
+def test_unseen_sentences_counts_down(bank):
+    assert bank.unseen_sentences("u1", "general", "easy") == 6
+    bank.sample_sentences("u1", "general", "easy", count=4)
+    assert bank.unseen_sentences("u1", "general", "easy") == 2
+
+def test_avoided_items_are_not_dealt(bank):
+    avoid = [sentence.upper() for sentence in SENTENCES[:5]]
+    assert bank.sample_sentences("u1", "general", "easy", count=3, avoid=avoid) == [SENTENCES[5]]
+
+def test_users_have_their_own_decks(bank):
+    words = [bank.sample_word("u1", "easy") for _ in range(4)]
+    assert sorted(words) == ["cat", "dog", "pen", "sun"]
+    assert bank.sample_word("u2", "easy") in words
+    bank.forget_user("u1")
+    assert bank.stats()["decks"] == 1
+
+def test_out_of_range_and_duplicate_sentences_are_skipped():
+    data = {"categories": {"general": {"description": "", "sentences": {
+        "easy": ["Too short", "The cat is here", "the cat is here", "This one has far too many words for easy"]}}},
+        "words": {"easy": ["cat"]}}
+    assert ContentBank(data).sentences("general", "easy") == ["The cat is here"]
+
+def test_shipped_bank_loads_within_word_limits():
+    bank = load_content_bank()
+    for (category, difficulty), sentences in bank.by_difficulty.items():
+        low, high = WORD_LIMITS[difficulty]
+        assert sentences, (category, difficulty)
+        assert all(low <= len(sentence.split()) <= high for sentence in sentences)
+        assert len({sentence.lower() for sentence in sentences}) == len(sentences)
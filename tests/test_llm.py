@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import groq
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm import CircuitBreaker, LLMGateway, LLMUnavailable
+
+REQUEST = httpx.Request("POST", "https://api.groq.test/chat/completions")
+
+def reply(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+def connection_error():
+    return groq.APIConnectionError(request=REQUEST)
+
+def bad_request():
+    return groq.BadRequestError("bad prompt", response=httpx.Response(400, request=REQUEST), body=None)
+
+class FakeClient:
+    """Stands in for Groq/AsyncGroq: answers from `outcomes` in turn (an exception is raised)"""
+
+    def __init__(self, *outcomes, gate=None):
+        self.outcomes = list(outcomes)
+        self.gate = gate
+        self.calls = 0
+        self.started = threading.Event()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes[min(self.calls, len(self.outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return reply(outcome)
+
+    def create(self, **kwargs):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return self._next()
+
+class FakeAsyncClient(FakeClient):
+    def __init__(self, *outcomes, gate=None):
+        super().__init__(*outcomes, gate=gate)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate))
+
+    async def acreate(self, **kwargs):
+        self.started.set()
+        if self.gate is not None:
+            await self.gate.wait()
+        return self._next()
+
+def gateway(client, **options):
+    options.setdefault("backoff", 0)
+    options.setdefault("breaker", CircuitBreaker(failures=2, reset=60))
+    return LLMGateway(client, **options)
+
+# ---------- CIRCUIT BREAKER ----------
+def test_breaker_opens_after_failures_in_a_row():
+    breaker = CircuitBreaker(failures=2, reset=60)
+    breaker.failure()
+    assert breaker.state() == "closed"
+    breaker.failure()
+    assert breaker.state() == "open"
+    assert not breaker.allow()
+    assert breaker.opens == 1
+
+def test_breaker_lets_one_trial_through_when_half_open():
+    breaker = CircuitBreaker(failures=1, reset=60)
+    breaker.failure()
+    breaker.opened_at -= 60
+    assert breaker.state() == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one trial at a time
+    assert not breaker.available()
+
+    breaker.failure()  # The trial failed: open again for another `reset`
+    assert breaker.state() == "open"
+    assert breaker.opens == 1
+
+    breaker.opened_at -= 60
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state() == "closed"
+    assert breaker.allow()
+
+def test_released_trial_can_be_claimed_again():
+    breaker = CircuitBreaker(failures=1, reset=60)
+    breaker.failure()
+    breaker.opened_at -= 60
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state() == "half-open"
+    assert breaker.allow()
+
+# ---------- RETRIES ----------
+def test_retryable_errors_are_retried():
+    client = FakeClient(connection_error(), "Hello")
+    llm = gateway(client, retries=2)
+    assert llm.complete("hi") == "Hello"
+    assert client.calls == 2
+    assert llm.stats()["retried"] == 1
+    assert llm.stats()["state"] == "closed"
+
+def test_retries_stop_at_the_deadline():
+    client = FakeClient(connection_error())
+    # Any backoff pause would overrun the deadline, so there is no second attempt
+    llm = gateway(client, retries=5, backoff=10, deadline=0.5)
+    started = time.time()
+    with pytest.raises(LLMUnavailable):
+        llm.complete("hi")
+    assert client.calls == 1
+    assert time.time() - started < 0.5
+
+def test_failed_calls_open_the_breaker_and_then_fail_fast():
+    client = FakeClient(connection_error())
+    llm = gateway(client, retries=1)
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            llm.complete("hi")
+    assert client.calls == 4
+    with pytest.raises(LLMUnavailable):
+        llm.complete("hi")
+    assert client.calls == 4
+    assert llm.stats()["rejected"] == 1
+    assert llm.stats()["state"] == "open"
+
+def test_client_errors_are_not_retried_and_do_not_open_the_breaker():
+    client = FakeClient(bad_request())
+    llm = gateway(client, retries=2)
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable):
+            llm.complete("hi")
+    assert client.calls == 3
+    assert llm.stats()["state"] == "closed"
+
+# ---------- SINGLE-FLIGHT ----------
+def test_identical_prompts_share_one_request():
+    gate = threading.Event()
+    client = FakeClient("Shared", gate=gate)
+    llm = gateway(client)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(llm.complete("same prompt"))) for _ in range(4)]
+    threads[0].start()
+    assert client.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while llm.stats()["coalesced"] < 3:
+        time.sleep(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["Shared"] * 4
+    assert client.calls == 1
+    assert llm.inflight == {}
+
+def test_async_identical_prompts_share_one_request():
+    async def scenario():
+        gate = asyncio.Event()
+        client = FakeAsyncClient("Shared", gate=gate)
+        llm = gateway(None)
+        llm.use_async_client(client)
+        tasks = [asyncio.create_task(llm.acomplete("same prompt")) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*tasks), client.calls, llm
+
+    results, calls, llm = asyncio.run(scenario())
+    assert results == ["Shared"] * 3
+    assert calls == 1
+    assert llm.stats()["coalesced"] == 2
+    assert llm.async_inflight == {}
+
+def test_async_followers_are_released_when_the_leader_is_cancelled():
+    async def scenario():
+        client = FakeAsyncClient("never", gate=asyncio.Event())
+        llm = gateway(None)
+        llm.use_async_client(client)
+        leader = asyncio.create_task(llm.acomplete("same prompt"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(llm.acomplete("same prompt"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(LLMUnavailable):
+            await asyncio.wait_for(follower, 1)
+        return llm
+
+    assert asyncio.run(scenario()).async_inflight == {}
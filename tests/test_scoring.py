@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import score_attempt, sounds_alike
+
+MINIMAL_PAIRS = [("shop", "ship"), ("love", "live"), ("lake", "like"), ("coke", "cake"),
+                 ("hell", "hill"), ("pill", "pull"), ("bard", "bird")]
+
+@pytest.mark.parametrize("spoken, expected", MINIMAL_PAIRS)
+def test_minimal_pairs_do_not_sound_alike(spoken, expected):
+    assert not sounds_alike(spoken, expected)
+
+@pytest.mark.parametrize("spoken, expected", MINIMAL_PAIRS)
+def test_minimal_pairs_lose_credit(spoken, expected):
+    result = score_attempt(f"the {spoken} is big", f"The {expected} is big")
+    assert result["score"] < 1.0
+    assert result["ops"][1][3] < 1.0
+
+@pytest.mark.parametrize("spoken, expected", [("there", "their"), ("write", "right"), ("two", "to"),
+                                              ("colour", "color"), ("favourite", "favorite")])
+def test_homophones_and_spelling_variants_sound_alike(spoken, expected):
+    assert sounds_alike(spoken, expected)
+    assert score_attempt(f"my {spoken} book", f"My {expected} book")["score"] == 1.0
+
+def test_numbers_and_contractions_are_normalized():
+    assert score_attempt("I'm 4 years old", "I am four years old")["score"] == 1.0
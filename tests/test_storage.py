@@ -0,0 +1,65 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leveling import level_for_xp, xp_for_level
+from storage import SQLiteUserStore, WriteBehindStore
+
+NOW = "2026-10-18 10:00:00"
+
+@pytest.fixture
+def store(tmp_path):
+    # A long interval, so only the test flushes
+    store = WriteBehindStore(SQLiteUserStore(str(tmp_path / "users.db")), interval=3600, batch_size=1000)
+    store.create_user("s1", {"password": "p", "name": "Asha", "class": "5", "division": "A",
+                             "created_at": NOW})
+    return store
+
+def test_pending_deltas_are_read_back_before_the_flush(store):
+    store.add_progress("s1", 3, "repeat", level_for_xp, NOW)
+    store.add_progress("s1", 2, "spellbee", level_for_xp, NOW)
+
+    assert store.inner.get_user("s1")["total_xp"] == 0
+    user = store.get_user("s1")
+    assert user["total_xp"] == 5
+    assert user["total_stars"] == 5
+    assert user["last_active"] == NOW
+    assert user["mode_stats"] == {"repeat": {"stars": 3, "sessions": 1}, "spellbee": {"stars": 2, "sessions": 1}}
+    assert dict(store.query_students({"class": "5"}))["s1"]["total_xp"] == 5
+
+def test_flush_writes_coalesced_deltas(store):
+    for _ in range(4):
+        store.add_progress("s1", 1, "repeat", level_for_xp, NOW)
+    store.flush()
+
+    assert store.pending == {}
+    assert store.flushing == {}
+    stored = store.inner.get_user("s1")
+    assert stored["total_xp"] == 4
+    assert stored["mode_stats"]["repeat"] == {"stars": 4, "sessions": 4}
+    assert store.get_user("s1")["total_xp"] == 4  # Not applied twice
+
+def test_level_change_is_flushed_right_away(store):
+    assert store.add_progress("s1", xp_for_level(2) - 1, "repeat", level_for_xp, NOW) == (1, 1)
+    assert store.inner.get_user("s1")["total_xp"] == 0
+
+    assert store.add_progress("s1", 1, "repeat", level_for_xp, NOW) == (1, 2)
+    assert store.pending == {}
+    assert store.inner.get_user("s1")["level"] == 2
+
+def test_failed_flush_keeps_the_batch_readable(store, monkeypatch):
+    store.add_progress("s1", 2, "repeat", level_for_xp, NOW)
+
+    def fail(updates, level_for_xp):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(store.inner, "apply_progress_batch", fail)
+    store.flush()
+    store.add_progress("s1", 1, "repeat", level_for_xp, NOW)
+
+    assert store.get_user("s1")["total_xp"] == 3
+    monkeypatch.undo()
+    store.flush()
+    assert store.inner.get_user("s1")["total_xp"] == 3
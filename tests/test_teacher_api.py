@@ -0,0 +1,77 @@
+import os
+import sys
+import base64
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configured before app is imported: a throwaway database, silent audio, no LLM key needed
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(), "teacher_api.db")
+os.environ["TTS_BACKEND"] = "stub"
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.pop("PRERENDER_AUDIO", None)
+
+import app as smartspeak
+
+CLASS, DIVISION = "T9", "Z"
+STUDENTS = {f"t9z{n}": 10 * n for n in range(1, 6)}  # user_id: total_xp
+
+@pytest.fixture(scope="module")
+def client():
+    for user_id, xp in STUDENTS.items():
+        smartspeak.store.create_user(user_id, {"password": "secret", "name": f"Student {user_id}",
+                                               "class": CLASS, "division": DIVISION, "total_xp": xp,
+                                               "total_stars": xp, "created_at": "2026-10-18 10:00:00"})
+    client = smartspeak.app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = "teacher"
+        session["role"] = "teacher"
+    return client
+
+def students_url(**params):
+    params = dict({"class": CLASS, "division": DIVISION}, **params)
+    return "/api/teacher/students?" + "&".join(f"{key}={value}" for key, value in params.items())
+
+@pytest.mark.parametrize("sort, order, expected", [
+    ("total_xp", "desc", sorted(STUDENTS, key=STUDENTS.get, reverse=True)),
+    ("user_id", "asc", sorted(STUDENTS)),
+    ("last_active", "asc", sorted(STUDENTS)),  # Never active: ties broken by user_id
+])
+def test_cursor_round_trip_visits_every_student_once(client, sort, order, expected):
+    seen, cursor = [], None
+    for _ in range(len(STUDENTS)):
+        url = students_url(sort=sort, order=order, limit=2) + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url).get_json()
+        seen += [student["user_id"] for student in page["students"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+def test_students_payload(client):
+    students = client.get(students_url(limit=1)).get_json()["students"]
+    assert "password" not in students[0]
+    assert students[0]["last_active"] is None
+
+def test_unchanged_page_answers_304(client):
+    first = client.get(students_url())
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    again = client.get(students_url(), headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.data == b""
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor!",
+    base64.urlsafe_b64encode(b"[1, 2, 3]").decode(),
+    base64.urlsafe_b64encode(b'["ten", "t9z1"]').decode(),  # total_xp cursors need a number
+])
+def test_malformed_cursor_is_a_bad_request(client, cursor):
+    response = client.get(students_url(cursor=cursor))
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+def test_teacher_login_required():
+    assert smartspeak.app.test_client().get(students_url()).status_code == 401
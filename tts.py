@@ -0,0 +1,346 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import wave
+import shutil
+import hashlib
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from gtts import gTTS
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No cross-process lock on this platform; every caller pre-renders
+
+# ================= AUDIO CACHE =================
+# Audio files are content-addressed: the same (text, lang, slow) always maps
+# to the same file name, so repeated words and praise lines are only
+# synthesized once and every gunicorn worker can reuse the same file.
+AUDIO_DIR = "static/audio"
+INDEX_PATH = os.path.join(AUDIO_DIR, "index.json")
+MANIFEST_PATH = os.path.join(AUDIO_DIR, "manifest.json")
+PRERENDER_LOCK_PATH = os.path.join(AUDIO_DIR, "prerender.lock")
+MAX_CACHE_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024
+MAX_CACHE_FILES = int(os.getenv("TTS_CACHE_MAX_FILES", "5000"))
+INDEX_SAVE_EVERY = 25  # Persist the index after this many changes
+
+_cache_lock = threading.Lock()
+_cache_index = OrderedDict()  # Format: {filename: {'size': 0, 'last_used': 0.0}}, least recently used first
+_cache_bytes = 0
+_index_loaded = False
+_unsaved_changes = 0
+_inflight = {}  # Format: {filename: threading.Lock()} while a file is being synthesized
+_manifest = {}  # Format: {filename: {'text': '', 'slow': False, 'lang': 'en'}} pre-rendered, never evicted
+_manifest_mtime = None  # Of the manifest.json last read, so a newer one written by another process is picked up
+
+def cache_key(text, lang="en", slow=False, backend=None):
+    """Stable hash for a piece of speech"""
+    backend = backend or TTS_BACKEND
+    normalized = " ".join(text.split())
+    raw = f"{lang}|{int(bool(slow))}|{normalized}"
+    if backend != "gtts":
+        raw = f"{backend}|{raw}"  # gTTS keeps the original keys so existing files stay valid
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _audio_filename(text, lang, slow, backend=None):
+    backend = backend or TTS_BACKEND
+    return f"{cache_key(text, lang, slow, backend)}.{TTS_BACKENDS[backend]['ext']}"
+
+def _load_index():
+    """Load the cache index and adopt audio files that are not in it yet"""
+    global _cache_bytes, _index_loaded
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    entries = {}
+    try:
+        if os.path.exists(INDEX_PATH):
+            with open(INDEX_PATH, 'r') as f:
+                entries = json.load(f)
+    except Exception as e:
+        print(f"Error loading audio index: {e}")
+        entries = {}
+
+    # Files written by other workers (or by the old uuid naming) are adopted
+    # with their modification time, so they become eviction candidates too.
+    for filename in os.listdir(AUDIO_DIR):
+        if not filename.endswith((".mp3", ".wav")):
+            continue
+        path = os.path.join(AUDIO_DIR, filename)
+        if filename not in entries:
+            entries[filename] = {'size': os.path.getsize(path), 'last_used': os.path.getmtime(path)}
+
+    _reload_manifest()
+
+    _cache_index.clear()
+    _cache_bytes = 0
+    for filename, entry in sorted(entries.items(), key=lambda item: item[1]['last_used']):
+        if os.path.exists(os.path.join(AUDIO_DIR, filename)):
+            _cache_index[filename] = entry
+            _cache_bytes += entry['size']
+    _index_loaded = True
+
+def _reload_manifest():
+    """Merge in manifest.json if it changed since it was last read (call with _cache_lock held)"""
+    global _manifest_mtime
+    try:
+        mtime = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return
+    if mtime == _manifest_mtime:
+        return
+    try:
+        with open(MANIFEST_PATH, 'r') as f:
+            _manifest.update(json.load(f))
+        _manifest_mtime = mtime
+    except Exception as e:
+        print(f"Error loading audio manifest: {e}")
+
+def _write_json(path, data):
+    """Write JSON through a temp file so readers never see a partial file"""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _save_index():
+    """Write the cache index atomically"""
+    global _unsaved_changes
+    try:
+        _write_json(INDEX_PATH, _cache_index)
+        _unsaved_changes = 0
+    except Exception as e:
+        print(f"Error saving audio index: {e}")
+
+def _mark_changed():
+    global _unsaved_changes
+    _unsaved_changes += 1
+    if _unsaved_changes >= INDEX_SAVE_EVERY:
+        _save_index()
+
+def _over_limit():
+    return _cache_bytes > MAX_CACHE_BYTES or len(_cache_index) > MAX_CACHE_FILES
+
+def _evict():
+    """Drop least recently used files until the cache fits its limits"""
+    global _cache_bytes
+    if not _over_limit():
+        return
+    # Another process may have pre-rendered files since this one last looked
+    _reload_manifest()
+    for filename in list(_cache_index):
+        if not _over_limit():
+            break
+        if filename in _manifest:
+            continue  # Pre-rendered audio stays on disk
+        entry = _cache_index.pop(filename)
+        _cache_bytes -= entry['size']
+        try:
+            os.remove(os.path.join(AUDIO_DIR, filename))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error evicting audio file: {e}")
+        _mark_changed()
+
+def _touch(filename):
+    """Record a cache hit; returns False if the file is gone"""
+    global _cache_bytes
+    path = os.path.join(AUDIO_DIR, filename)
+    if filename in _cache_index:
+        if os.path.exists(path):
+            _cache_index[filename]['last_used'] = time.time()
+            _cache_index.move_to_end(filename)
+            return True
+        _cache_bytes -= _cache_index.pop(filename)['size']
+        return False
+    if os.path.exists(path):
+        # Written by another worker
+        _add(filename)
+        return True
+    return False
+
+def _add(filename):
+    global _cache_bytes
+    size = os.path.getsize(os.path.join(AUDIO_DIR, filename))
+    _cache_index[filename] = {'size': size, 'last_used': time.time()}
+    _cache_bytes += size
+    _mark_changed()
+    _evict()
+
+def cache_stats():
+    """Current size of the audio cache (exported as audio_cache_files / audio_cache_bytes)"""
+    with _cache_lock:
+        if not _index_loaded:
+            _load_index()
+        return {'files': len(_cache_index), 'bytes': _cache_bytes}
+
+@atexit.register
+def _flush_index():
+    with _cache_lock:
+        if _index_loaded and _unsaved_changes:
+            _save_index()
+
+# ================= TTS BACKENDS =================
+# Selected with TTS_BACKEND:
+#   gtts  - Google Translate TTS (needs the network), writes mp3
+#   local - espeak-ng/espeak on the machine, or pyttsx3 if installed, writes wav
+#   stub  - deterministic silent wav, for tests, benchmarks and load tests
+def _gtts_synthesize(text, lang, slow, path):
+    gTTS(text=text, lang=lang, slow=slow).save(path)
+
+def _local_synthesize(text, lang, slow, path):
+    espeak = shutil.which("espeak-ng") or shutil.which("espeak")
+    if espeak:
+        rate = "110" if slow else "160"
+        subprocess.run([espeak, "-v", lang, "-s", rate, "-w", path, text],
+                       check=True, capture_output=True, timeout=30)
+        return
+    try:
+        import pyttsx3
+    except ImportError:
+        raise RuntimeError("No local TTS engine found. Install espeak-ng or pyttsx3.")
+    engine = pyttsx3.init()
+    engine.setProperty("rate", 110 if slow else 160)
+    engine.save_to_file(text, path)
+    engine.runAndWait()
+
+def _stub_synthesize(text, lang, slow, path):
+    # Silence whose length depends only on the input, so runs are reproducible
+    seconds = min(0.1 + 0.3 * len(text.split()) * (1.5 if slow else 1.0), 10.0)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\x00\x00" * int(8000 * seconds))
+
+TTS_BACKENDS = {
+    "gtts": {"ext": "mp3", "synthesize": _gtts_synthesize},
+    "local": {"ext": "wav", "synthesize": _local_synthesize},
+    "stub": {"ext": "wav", "synthesize": _stub_synthesize},
+}
+
+TTS_BACKEND = os.getenv("TTS_BACKEND", "gtts")
+if TTS_BACKEND not in TTS_BACKENDS:
+    print(f"Unknown TTS_BACKEND '{TTS_BACKEND}', using gtts")
+    TTS_BACKEND = "gtts"
+
+# ================= TTS =================
+def speak_to_file(text, slow=False, lang="en"):
+    """Return the URL of an audio file for text, synthesizing it only on a cache miss"""
+    backend = TTS_BACKEND
+    filename = _audio_filename(text, lang, slow, backend)
+    path = f"{AUDIO_DIR}/{filename}"
+
+    with _cache_lock:
+        if not _index_loaded:
+            _load_index()
+        if _touch(filename):
+            metrics.inc("tts_requests_total", result="hit")
+            return "/" + path
+        key_lock = _inflight.setdefault(filename, threading.Lock())
+
+    # Only one thread synthesizes a given file; the others wait and reuse it
+    with key_lock:
+        with _cache_lock:
+            if _touch(filename):
+                metrics.inc("tts_requests_total", result="hit")
+                return "/" + path
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with metrics.timed("tts_synthesize_seconds", backend=backend):
+                TTS_BACKENDS[backend]["synthesize"](text, lang, slow, tmp_path)
+            metrics.inc("tts_requests_total", result="synthesized")
+            os.replace(tmp_path, path)
+            with _cache_lock:
+                _add(filename)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with _cache_lock:
+                _inflight.pop(filename, None)
+
+    return "/" + path
+
+# ================= PRE-RENDERED AUDIO =================
+def prerendered_audio(text, slow=False, lang="en"):
+    """Return the URL of pre-rendered audio for text, or None - never synthesizes"""
+    filename = _audio_filename(text, lang, slow)
+    with _cache_lock:
+        if not _index_loaded:
+            _load_index()
+        if filename in _manifest and _touch(filename):
+            return f"/{AUDIO_DIR}/{filename}"
+    return None
+
+def prerender(items, workers=4, wait=True):
+    """Synthesize (text, slow) pairs ahead of time and record them in the manifest.
+
+    Runs under an exclusive lock on PRERENDER_LOCK_PATH, so only one process
+    renders and writes the manifest at a time; with wait=False a process that
+    finds the lock taken skips the run. Items already in the manifest with
+    their file on disk are not rendered again.
+    """
+    items = list(dict.fromkeys((" ".join(text.split()), bool(slow)) for text, slow in items if text.strip()))
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    with open(PRERENDER_LOCK_PATH, 'a') as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return {'rendered': 0, 'failed': 0, 'skipped': len(items)}
+        return _prerender_locked(items, workers)
+
+def _prerender_locked(items, workers):
+    global _manifest_mtime
+    with _cache_lock:
+        if not _index_loaded:
+            _load_index()
+        _reload_manifest()
+        missing = []
+        for text, slow in items:
+            filename = _audio_filename(text, "en", slow)
+            if filename not in _manifest or not os.path.exists(os.path.join(AUDIO_DIR, filename)):
+                missing.append((text, slow))
+    if not missing:
+        return {'rendered': 0, 'failed': 0, 'skipped': len(items)}
+
+    rendered = 0
+    failed = 0
+
+    def render(item):
+        text, slow = item
+        filename = _audio_filename(text, "en", slow)
+        # Pin before synthesizing so a full cache cannot evict it mid-run
+        with _cache_lock:
+            _manifest[filename] = {'text': text, 'slow': slow, 'lang': "en"}
+        try:
+            speak_to_file(text, slow=slow)
+        except Exception:
+            with _cache_lock:
+                _manifest.pop(filename, None)
+            raise
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render, item) for item in missing]
+        for future in as_completed(futures):
+            try:
+                future.result()
+                rendered += 1
+            except Exception as e:
+                print(f"Error pre-rendering audio: {e}")
+                failed += 1
+
+    with _cache_lock:
+        try:
+            _write_json(MANIFEST_PATH, _manifest)
+            _manifest_mtime = os.path.getmtime(MANIFEST_PATH)
+        except Exception as e:
+            print(f"Error saving audio manifest: {e}")
+        _save_index()
+
+    return {'rendered': rendered, 'failed': failed, 'skipped': len(items) - len(missing)}
@@ -0,0 +1,73 @@
+import os
+import time
+import threading
+from storage import connect_sqlite
+
+# ================= USAGE SENTENCE CACHE =================
+# Up to USAGE_VARIANTS example sentences per spelling word, each with its
+# rendered audio URL, in a SQLite table shared by every worker. take() serves
+# the least-served variant (random among ties), so children rotate through all
+# of them. A variant retires after USAGE_MAX_SERVES uses; the app refills a
+# word in the background whenever it has fewer than USAGE_VARIANTS live ones.
+USAGE_VARIANTS = int(os.getenv("USAGE_VARIANTS", "4"))
+USAGE_MAX_SERVES = int(os.getenv("USAGE_MAX_SERVES", "25"))
+
+class UsageCache:
+    """Rotating usage sentences per word"""
+
+    def __init__(self, path, variants=USAGE_VARIANTS, max_serves=USAGE_MAX_SERVES):
+        self.path = path
+        self.variants = variants
+        self.max_serves = max_serves
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.connect().executescript("""
+            CREATE TABLE IF NOT EXISTS usage_sentences (
+                word TEXT NOT NULL,
+                sentence TEXT NOT NULL,
+                audio TEXT NOT NULL,
+                served INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (word, sentence)
+            );
+        """)
+
+    def connect(self):
+        return connect_sqlite(self.local, self.path)
+
+    def take(self, word):
+        """(sentence, audio) for the next variant of word, or None"""
+        # Pick and count in one statement, so two workers can't both serve a
+        # variant's last use (UPDATE ... RETURNING needs SQLite 3.35+)
+        row = self.connect().execute(
+            "UPDATE usage_sentences SET served = served + 1 WHERE rowid = ("
+            "SELECT rowid FROM usage_sentences WHERE word = ? AND served < ? ORDER BY served, RANDOM() LIMIT 1) "
+            "RETURNING sentence, audio", (word, self.max_serves)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], row[1]
+
+    def live(self, word):
+        """Number of variants of word that can still be served"""
+        return self.connect().execute("SELECT COUNT(*) FROM usage_sentences WHERE word = ? AND served < ?",
+                                      (word, self.max_serves)).fetchone()[0]
+
+    def needs(self, word):
+        """How many variants word is short of"""
+        return max(0, self.variants - self.live(word))
+
+    def add(self, word, sentence, audio):
+        """Store a new variant; returns False if word already has it"""
+        conn = self.connect()
+        conn.execute("DELETE FROM usage_sentences WHERE word = ? AND served >= ?", (word, self.max_serves))
+        cursor = conn.execute("INSERT OR IGNORE INTO usage_sentences (word, sentence, audio, served, created_at) "
+                              "VALUES (?, ?, ?, 0, ?)", (word, sentence, audio, time.time()))
+        return cursor.rowcount > 0
+
+    def stats(self):
+        row = self.connect().execute("SELECT COUNT(DISTINCT word), COUNT(*) FROM usage_sentences "
+                                     "WHERE served < ?", (self.max_serves,)).fetchone()
+        return {'words': row[0], 'variants': row[1], 'hits': self.hits, 'misses': self.misses}